@@ -1,13 +1,30 @@
 import copy
+import os
+import random
 import cocotb
-from cocotb.triggers import Timer
+from cocotb.clock import Clock
+from cocotb.triggers import Timer, FallingEdge, ClockCycles
+
+import chain_log
+import fsm_table
+from scan_stats import STATS, timed
+from wave_trace import WaveTracer
 
 
 # Make sure to set FILE_NAME
 # to the filepath of the .log
 # file you are working with
+# (SCAN_LOG overrides it, e.g. from regress.py)
+# NETLIST_NAME lists the sources actually simulated: SCAN_NETLIST,
+# else VERILOG_SOURCES as exported by testbench.mk (netlist_sim sets
+# SCAN_NETLIST itself)
 CHAIN_LENGTH = -1
-FILE_NAME    = "hidden_fsm/hidden_fsm.log"
+FILE_NAME    = os.environ.get("SCAN_LOG", "hidden_fsm/hidden_fsm.log")
+NETLIST_NAME = os.environ.get("SCAN_NETLIST") or os.environ.get("VERILOG_SOURCES", "")
+ADDER_LOG    = os.environ.get("SCAN_LOG", "adder/adder.log")
+
+CLOCK_PERIOD_NS = 20
+FREE_CLOCK      = None      # Running clock task, see start_clock()
 
 
 
@@ -25,10 +42,13 @@ class Register:
 
         self.bit_list = list()      # Set this to the register's contents, if you want to
         self.index_list = list()    # List of bit mappings into chain. See handout
+        self.chain_list = list()    # Chain ID of each bit, parallel to index_list
 
         self.first = -1             # LSB mapping into scan chain
         self.last  = -1             # MSB mapping into scan chain
 
+        self.runs = list()          # (reg bit, chain index, width) slices. See build_runs()
+
 
 # Holds information about the scan chain
 # in your design.
@@ -44,9 +64,20 @@ class ScanChain:
         
         self.chain_length = 0       # Number of FFs in chain
 
+        self.chain_lengths = list() # Number of FFs in each chain, by chain ID
+        self.chain_offsets = list() # Position of each chain inside the image
+
+        self.image = 0              # Whole chain as one int, bit i = FF at index i
+                                    # (chain k starts at chain_offsets[k])
+
 
 # Sets up a new ScanChain object
 # and returns it
+# Each .log line is "index name bit", optionally followed by the
+# chain ID of the FF (default 0) when the design has several chains;
+# indices then count from scan_in within each chain.
+# The file is parsed and validated by chain_log, which caches the
+# result keyed by the file contents.
 
 ################     
 # DO NOT EDIT!!!
@@ -54,37 +85,101 @@ class ScanChain:
 def setup_chain(filename):
 
     scan_chain = ScanChain()
+    log = chain_log.load_log(filename)
+
+    for reg_id, name in enumerate(log.names):
+        start, size = log.starts[reg_id], log.sizes[reg_id]
+        cur_reg = Register(name)
+        cur_reg.index_list = log.index[start:start + size].tolist()
+        cur_reg.chain_list = log.chain[start:start + size].tolist()
+        cur_reg.bit_list   = [0] * size
+        cur_reg.size = size
+        cur_reg.first = cur_reg.index_list[0]
+        cur_reg.last  = cur_reg.index_list[-1]
+        scan_chain.registers[name] = cur_reg
+
+    scan_chain.chain_lengths = list(log.chain_lengths)
+    scan_chain.chain_length = len(log)
+
+    offset = 0
+    for length in scan_chain.chain_lengths:
+        scan_chain.chain_offsets.append(offset)
+        offset += length
+
+    build_runs(scan_chain)
+    return scan_chain
 
-    f = open(filename, "r")
-    for line in f:
-        linelist = line.split()
-        index, name, bit = linelist[0], linelist[1], linelist[2]
-
-        if name not in scan_chain.registers:
-            reg = Register(name)
-            reg.index_list.append((int(bit), int(index)))
-            scan_chain.registers[name] = reg
 
-        else:
-            scan_chain.registers[name].index_list.append((int(bit), int(index)))
-        
-    f.close()
-
-    for name in scan_chain.registers:
-        cur_reg = scan_chain.registers[name]
-        cur_reg.index_list.sort()
-        new_list = list()
-        for tuple in cur_reg.index_list:
-            new_list.append(tuple[1])
-        
-        cur_reg.index_list = new_list
-        cur_reg.bit_list   = [0] * len(new_list)
-        cur_reg.size = len(new_list)
-        cur_reg.first = new_list[0]
-        cur_reg.last  = new_list[-1]
-        scan_chain.chain_length += len(cur_reg.index_list)
+# Precomputes the scatter/gather tables of every register.
+# A run (reg_bit, index, width) says that register bits
+# reg_bit..reg_bit+width-1 sit at image bits index..index+width-1,
+# so a register mapped in order is moved with a single shift and mask.
+# With several chains, image bit = chain_offsets[chain ID] + index.
+# No per-register mask is kept: on a long chain each one would be an
+# int as wide as the chain up to that register.
 
-    return scan_chain
+def build_runs(chain):
+    offsets = chain.chain_offsets
+    for name in chain.registers:
+        cur_reg = chain.registers[name]
+        runs = list()
+        reg_bit, first, width = 0, -1, 0
+        for bit, (index, chain_id) in enumerate(zip(cur_reg.index_list, cur_reg.chain_list)):
+            index += offsets[chain_id]
+            if index == first + width:
+                width += 1
+            else:
+                if width:
+                    runs.append((reg_bit, first, width))
+                reg_bit, first, width = bit, index, 1
+        if width:
+            runs.append((reg_bit, first, width))
+
+        cur_reg.runs = runs
+
+
+# Builds a chain image from {register name: value}.
+# Registers not named keep their bits from `image`.
+
+def encode_registers(chain, values, image=0):
+    for name, value in values.items():
+        if STATS.enabled:
+            STATS.register(name, "writes")
+        for reg_bit, index, width in chain.registers[name].runs:
+            field = (1 << width) - 1
+            image = (image & ~(field << index)) | (((value >> reg_bit) & field) << index)
+    return image
+
+
+# Returns {register name: value} read out of a chain image, for
+# the given names or every register. Also keeps the image in
+# chain.image.
+
+def decode_registers(chain, image, names=None):
+    chain.image = image
+    values = dict()
+    for name in (chain.registers if names is None else names):
+        if STATS.enabled:
+            STATS.register(name, "reads")
+        value = 0
+        for reg_bit, index, width in chain.registers[name].runs:
+            value |= ((image >> index) & ((1 << width) - 1)) << reg_bit
+        values[name] = value
+    return values
+
+
+# Converts between a chain image and a list of bits
+# (bits[i] = FF at index i), as used by input_chain().
+
+def bits_to_image(bits):
+    image = 0
+    for i, bit in enumerate(bits):
+        image |= (int(bit) & 1) << i
+    return image
+
+
+def image_to_bits(image, length):
+    return [(image >> i) & 1 for i in range(length)]
 
 
 # Prints info of given Register object
@@ -126,10 +221,62 @@ async def step_clock(dut):
     # TODO: YOUR CODE HERE 
     ######################
 
+    if STATS.enabled:
+        STATS.clocks(1, int(dut.scan_en.value))
+
+    if FREE_CLOCK is not None:
+        await FallingEdge(dut.clk)
+        return
+
     dut.clk.value = 1
-    await Timer(10, units='ns')
+    await Timer(CLOCK_PERIOD_NS // 2, units='ns')
     dut.clk.value = 0
-    await Timer(10, units='ns')
+    await Timer(CLOCK_PERIOD_NS // 2, units='ns')
+
+
+# This function steps the clock n times with scan_in held constant.
+# With the free-running clock this is a single wait.
+
+async def step_clocks(dut, n):
+
+    if n <= 0:
+        return
+
+    if FREE_CLOCK is not None:
+        if STATS.enabled:
+            STATS.clocks(n, int(dut.scan_en.value))
+        await ClockCycles(dut.clk, n, rising=False)
+        return
+
+    for _ in range(n):
+        await step_clock(dut)
+
+
+# Starts a free-running clock on dut.clk. From then on step_clock()
+# waits for the next falling edge instead of toggling clk by hand,
+# so scan_in is driven half a period before each rising edge and
+# runs of constant scan_in cost one await.
+# Code between steps must not wait longer than half a period, or
+# the clock will run extra cycles.
+
+async def start_clock(dut):
+    global FREE_CLOCK
+
+    if FREE_CLOCK is None:
+        dut.clk.value = 0
+        clock = Clock(dut.clk, CLOCK_PERIOD_NS, units='ns')
+        FREE_CLOCK = cocotb.start_soon(clock.start(start_high=False))
+        await Timer(1, units='ns')
+
+
+# Stops the free-running clock and returns to Timer-driven clocking.
+
+def stop_clock():
+    global FREE_CLOCK
+
+    if FREE_CLOCK is not None:
+        FREE_CLOCK.kill()
+        FREE_CLOCK = None
     
 
 #-------------------------------------------------------------------
@@ -139,19 +286,18 @@ async def step_clock(dut):
 # Hint: How many clocks would it take for value to reach
 #       the specified FF?
         
+@timed("input_chain_single")
 async def input_chain_single(dut, bit, ff_index):
 
     ######################
     # TODO: YOUR CODE HERE 
     ######################
     dut.scan_en.value = 1
-    for i in range(ff_index + 1): #exclusive in python here
-        if(i==0):
-            dut.scan_in.value = bit
-            await step_clock(dut)
-        else:
-            dut.scan_in.value = 0
-            await step_clock(dut)
+    dut.scan_in.value = bit
+    await step_clock(dut)
+
+    dut.scan_in.value = 0
+    await step_clocks(dut, ff_index)
     
     dut.scan_en.value = 0
     
@@ -164,6 +310,7 @@ async def input_chain_single(dut, bit, ff_index):
 # Hint: How many clocks would it take for value to reach
 #       the specified FF?
         
+@timed("input_chain")
 async def input_chain(dut, bit_list, ff_index):
 
     dut.scan_en.value = 1
@@ -174,9 +321,8 @@ async def input_chain(dut, bit_list, ff_index):
         await step_clock(dut)
     
 
-    for _ in range(ff_index):
-        dut.scan_in.value = 0 
-        await step_clock(dut)
+    dut.scan_in.value = 0 
+    await step_clocks(dut, ff_index)
     
     dut.scan_en.value = 0
     # await step_clock(dut)
@@ -190,6 +336,7 @@ async def input_chain(dut, bit_list, ff_index):
 # This function retrieves a single bit value from the
 # chain at specified index 
         
+@timed("output_chain_single")
 async def output_chain_single(dut, ff_index):
 
     ######################
@@ -199,9 +346,8 @@ async def output_chain_single(dut, ff_index):
     dut.scan_en.value = 1
     await step_clock(dut)
 
-    for _ in range(CHAIN_LENGTH - ff_index-1): 
-        dut.scan_in.value = 0
-        await step_clock(dut)
+    dut.scan_in.value = 0
+    await step_clocks(dut, CHAIN_LENGTH - ff_index - 1)
     return dut.scan_out.value      
 
 #-----------------------------------------------
@@ -210,18 +356,29 @@ async def output_chain_single(dut, ff_index):
 # chain at specified index 
 # This is an upgrade of input_chain_single() and should be accomplished
 #   for Part H of Task 1
+# With recirculate=True the chain is read with recirculate_chain()
+# and keeps its contents; `length` is the chain length or, on a design
+# with several chains, the list of them (chain.chain_lengths), and
+# ff_index counts over the chains in that order.
         
-async def output_chain(dut, ff_index, output_length):
+@timed("output_chain")
+async def output_chain(dut, ff_index, output_length, recirculate=False, length=None):
 
     ######################
     # TODO: YOUR CODE HERE 
     ######################
     global CHAIN_LENGTH
+    if recirculate:
+        if length is None:
+            length = CHAIN_LENGTH
+        lengths = list(length) if isinstance(length, (list, tuple)) else [length]
+        image = await recirculate_chain(dut, lengths)
+        return image_to_bits(image >> ff_index, output_length)
+
     dut.scan_en.value = 1
     output_bits = []
-    for _ in range(CHAIN_LENGTH - ff_index - output_length ):  # aligning to correct position
-        dut.scan_in.value = 0
-        await step_clock(dut)
+    dut.scan_in.value = 0
+    await step_clocks(dut, CHAIN_LENGTH - ff_index - output_length)  # aligning to correct position
     
     for _ in range(output_length):  # extracting required bits
         output_bits.append(dut.scan_out.value)
@@ -235,7 +392,530 @@ async def output_chain(dut, ff_index, output_length):
     return result
 
 
+#-----------------------------------------------
+
+# This function loads a full chain image while unloading
+# the previous contents in the same cycles.
+# Bit i of `image` ends up in the FF at index i, and the returned
+# int holds the old contents in the same order, so one call
+# replaces an output_chain() of the last response plus an
+# input_chain() of the next pattern.
+# `length` may also be a list of chain lengths (chain.chain_lengths),
+# in which case all chains are shifted together by shift_chains().
+
+@timed("shift_image")
+async def shift_image(dut, image, length=None):
+
+    if length is None:
+        length = CHAIN_LENGTH
+    if isinstance(length, (list, tuple)):
+        if len(length) > 1:
+            return await shift_chains(dut, image, length)
+        length = length[0]
+
+    dut.scan_en.value = 1
+    unload = 0
+
+    for i in reversed(range(length)):
+        unload |= int(dut.scan_out.value) << i  # FF i is at scan_out now
+        dut.scan_in.value = (image >> i) & 1
+        await step_clock(dut)
+
+    dut.scan_en.value = 0
+    return unload
+
+
+# This function shifts K parallel chains in lockstep, chain k
+# on bit k of the scan_in/scan_out ports. `image` and the returned
+# unload hold chain k at offset sum(lengths[:k]), as in
+# ScanChain.chain_offsets. Shorter chains get padding bits first,
+# so every chain is loaded after max(lengths) cycles.
+
+@timed("shift_chains")
+async def shift_chains(dut, image, lengths):
+
+    longest = max(lengths)
+    offsets = list()
+    offset = 0
+    for length in lengths:
+        offsets.append(offset)
+        offset += length
+
+    dut.scan_en.value = 1
+    unload = 0
+
+    for cycle in range(longest):
+        out_word = int(dut.scan_out.value)
+        in_word = 0
+        for k, length in enumerate(lengths):
+            if cycle < length:  # FF length-1-cycle of chain k is at scan_out[k]
+                unload |= ((out_word >> k) & 1) << (offsets[k] + length - 1 - cycle)
+            index = longest - 1 - cycle
+            if index < length:
+                in_word |= ((image >> (offsets[k] + index)) & 1) << k
+        dut.scan_in.value = in_word
+        await step_clock(dut)
+
+    dut.scan_en.value = 0
+    return unload
+
+
+# Same as shift_image(), with bit lists instead of ints
+# (load_bits[i] = FF at index i).
+
+async def shift_chain(dut, load_bits):
+    unload = await shift_image(dut, bits_to_image(load_bits), len(load_bits))
+    return image_to_bits(unload, len(load_bits))
+
+
+# This function reads the whole chain without destroying it:
+# every bit coming out of scan_out is fed back into scan_in, so
+# after one full rotation every FF holds its old value again.
+# With several chains (`lengths` = chain.chain_lengths) all are
+# rotated for max(lengths) cycles; a shorter chain k gets its own
+# output back delayed by max(lengths) - lengths[k] cycles, so its
+# bits still land where they started.
+# Image bits set in `write_mask` are loaded from `image` instead of
+# being fed back, so a write and a read share one pass.
+#
+# Returns the old chain image, as shift_image() does.
+
+@timed("recirculate_chain")
+async def recirculate_chain(dut, lengths=None, image=0, write_mask=0):
+
+    if lengths is None:
+        lengths = [CHAIN_LENGTH]
+    longest = max(lengths)
+    offsets = list()
+    offset = 0
+    for length in lengths:
+        offsets.append(offset)
+        offset += length
+
+    dut.scan_en.value = 1
+    unload = 0
+    history = list()    # scan_out word of each cycle
+
+    for cycle in range(longest):
+        out_word = int(dut.scan_out.value)
+        history.append(out_word)
+        in_word = 0
+        for k, length in enumerate(lengths):
+            if cycle < length:  # FF length-1-cycle of chain k is at scan_out[k]
+                unload |= ((out_word >> k) & 1) << (offsets[k] + length - 1 - cycle)
+            index = longest - 1 - cycle     # FF of chain k this bit ends up in
+            delay = longest - length
+            if index >= length:
+                continue
+            position = offsets[k] + index
+            if (write_mask >> position) & 1:
+                in_word |= ((image >> position) & 1) << k
+            else:
+                in_word |= ((history[cycle - delay] >> k) & 1) << k
+        dut.scan_in.value = in_word
+        await step_clock(dut)
+
+    dut.scan_en.value = 0
+    return unload
+
+
+# Image bits covered by the named registers.
+
+def register_mask(chain, names):
+    mask = 0
+    for name in names:
+        for reg_bit, index, width in chain.registers[name].runs:
+            mask |= ((1 << width) - 1) << index
+    return mask
+
 
+# Writes {register name: value} in one full-chain pass, wherever
+# the registers' bits sit (Register.index_list, contiguous or not).
+# Every other register keeps its value. Returns the old values of
+# the written registers.
+
+async def write_registers(dut, chain, values):
+    image = encode_registers(chain, values)
+    with STATS.attribute(values):
+        unload = await recirculate_chain(dut, chain.chain_lengths, image,
+                                         register_mask(chain, values))
+    return decode_registers(chain, unload, list(values))
+
+
+# Reads the named registers (all when names is None) in one pass,
+# leaving the chain as it was. Returns {register name: value}.
+
+async def read_registers(dut, chain, names=None):
+    with STATS.attribute(chain.registers if names is None else names):
+        unload = await recirculate_chain(dut, chain.chain_lengths)
+    return decode_registers(chain, unload, names)
+
+
+# Reads one register by name; the chain is left as it was.
+
+async def read_register(dut, chain, name):
+    return (await read_registers(dut, chain, [name]))[name]
+
+
+#-----------------------------------------------
+
+# Chain integrity checks, meant as a quick gate before long pattern
+# runs: a miscounted or broken chain otherwise just returns wrong
+# data from every shift.
+
+class ChainIntegrityError(Exception):
+    pass
+
+
+# Shifts one scan_in word per cycle and returns the scan_out word
+# seen before each edge.
+
+async def _shift_words(dut, words):
+    dut.scan_en.value = 1
+    outputs = list()
+    for word in words:
+        outputs.append(int(dut.scan_out.value))
+        dut.scan_in.value = word
+        await step_clock(dut)
+    dut.scan_en.value = 0
+    return outputs
+
+
+# Cycles a check shifts for: room for chains up to twice as long as
+# the .log says.
+
+def _check_cycles(lengths):
+    return 2 * max(lengths) + 8
+
+
+# This function measures the real length of every chain: the chains
+# are flushed with zeros, then a single 1 is shifted in and the cycles
+# until it shows up on scan_out counted. Returns one length per chain,
+# or None where the marker never came out (stuck or broken chain).
+
+@timed("measure_chain_lengths")
+async def measure_chain_lengths(dut, lengths):
+    cycles = _check_cycles(lengths)
+    ones = (1 << len(lengths)) - 1
+    outputs = await _shift_words(dut, [0] * cycles + [ones] + [0] * cycles)
+
+    measured = list()
+    for k in range(len(lengths)):
+        bits = [(word >> k) & 1 for word in outputs[cycles:]]
+        if bits[0] or 1 not in bits:    # still 1 after the flush, or no marker
+            measured.append(None)
+        else:
+            measured.append(bits.index(1))
+    return measured
+
+
+# This function shifts 0011... through the chains and compares what
+# comes out `delays[k]` cycles later. Returns one verdict per chain:
+# "ok", "inverted", "stuck-at-0", "stuck-at-1" or "corrupt".
+
+@timed("flush_chains")
+async def flush_chains(dut, lengths, delays=None):
+    delays = lengths if delays is None else delays
+    cycles = _check_cycles(lengths)
+    pattern = [(cycle >> 1) & 1 for cycle in range(cycles)]
+    ones = (1 << len(lengths)) - 1
+    outputs = await _shift_words(dut, [ones if bit else 0 for bit in pattern])
+
+    verdicts = list()
+    for k, delay in enumerate(delays):
+        bits = [(word >> k) & 1 for word in outputs]
+        tail = set(bits[cycles // 2:])
+        shifted = [(bits[t], pattern[t - delay]) for t in range(delay, cycles)]
+        if len(tail) == 1:
+            verdicts.append(f"stuck-at-{tail.pop()}")
+        elif all(out == bit for out, bit in shifted):
+            verdicts.append("ok")
+        elif all(out != bit for out, bit in shifted):
+            verdicts.append("inverted")
+        else:
+            verdicts.append("corrupt")
+    return verdicts
+
+
+# This function narrows down where chain k is broken when it only
+# ever shifts out `stuck`. Shifting alone cannot see past the break,
+# so each probe loads random data, runs one capture cycle with random
+# values on the functional `inputs` ({port name: width}, as for
+# drive_inputs()) and unloads while loading the next probe: FFs
+# downstream of the break capture fresh values and still reach
+# scan_out, and the first one (counting from scan_in) that shows a
+# value other than `stuck` bounds the break.
+# Each probe costs one chain traversal. Probing stops once the bound
+# has held for `settle` probes in a row, and after at most `probes`
+# (default log2(L), at least 3) for a chain of L FFs.
+#
+# Returns the index f of the first FF that reached scan_out: the break
+# is on the scan path into FF f or before it (0: between scan_in and
+# FF 0). None when no FF ever showed anything but `stuck`.
+
+@timed("locate_break")
+async def locate_break(dut, lengths, k, stuck, inputs=None, probes=None, settle=2, seed=0):
+    length = lengths[k]
+    offset = sum(lengths[:k])
+    inputs = inputs or dict()
+    probes = probes or max(3, length.bit_length())
+    rng = random.Random(seed)
+    total = sum(lengths)
+
+    first = None
+    held = 0
+    await shift_image(dut, rng.getrandbits(total), lengths)
+    for _ in range(probes):
+        drive_inputs(dut, inputs, rng.getrandbits(sum(inputs.values())))
+        await Timer(1, units='ns')
+        await step_clock(dut)
+        drive_inputs(dut, inputs, 0)
+        unload = await shift_image(dut, rng.getrandbits(total), lengths)
+
+        bits = (unload >> offset) & ((1 << length) - 1)
+        if stuck:
+            bits ^= (1 << length) - 1
+        lowest = (bits & -bits).bit_length() - 1 if bits else None
+        if lowest is not None and (first is None or lowest < first):
+            first = lowest
+            held = 0
+        elif first is not None:
+            held += 1
+            if held >= settle:
+                break
+    return first
+
+
+# Name of the FF at `index` of chain k, as in the .log.
+
+def _ff_name(chain, k, index):
+    for name, reg in chain.registers.items():
+        for bit, (position, chain_id) in enumerate(zip(reg.index_list, reg.chain_list)):
+            if position == index and chain_id == k:
+                return f"{name}[{bit}]"
+    return f"FF {index}"
+
+
+# This function checks every chain of `chain` against the .log: real
+# length, polarity, and stuck bits, with the break located when a
+# chain is stuck (`inputs` as for locate_break()). Returns a list of
+# problems, empty when all is well.
+
+async def check_chain(dut, chain, inputs=None):
+    lengths = chain.chain_lengths
+    measured = await measure_chain_lengths(dut, lengths)
+    delays = [m if m is not None else length for m, length in zip(measured, lengths)]
+    verdicts = await flush_chains(dut, lengths, delays)
+
+    problems = list()
+    for k, length in enumerate(lengths):
+        if measured[k] is not None and measured[k] != length:
+            problems.append(f"chain {k}: {measured[k]} FFs between scan_in and scan_out, "
+                            f"the .log has {length}")
+        if verdicts[k] == "ok":
+            continue
+        problem = f"chain {k}: {verdicts[k]}"
+        if verdicts[k].startswith("stuck"):
+            first = await locate_break(dut, lengths, k, int(verdicts[k][-1]), inputs)
+            if first is None:
+                problem += ", break location unknown"
+            elif first == 0:
+                problem += ", broken between scan_in and FF 0"
+            else:
+                problem += (f", broken at or before the scan input of FF {first} "
+                            f"({_ff_name(chain, k, first)}); FF {first} onward shift out")
+        problems.append(problem)
+    return problems
+
+
+# Runs check_chain() as a gate in front of a test: SCAN_CHECK=0 skips
+# it, any problem raises ChainIntegrityError. Returns False when
+# SCAN_CHECK=only asks for the check and nothing else.
+
+async def gate_chain(dut, chain, inputs=None):
+    scan_check = os.environ.get("SCAN_CHECK", "1")
+    if scan_check == "0":
+        return True
+    problems = await check_chain(dut, chain, inputs)
+    if problems:
+        stop_clock()
+        raise ChainIntegrityError("; ".join(problems))
+    print(f"scan chain check passed: {chain.chain_lengths} FFs")
+    return scan_check != "only"
+
+
+#-----------------------------------------------
+
+# Default capture step for apply_patterns(): one functional clock.
+
+@timed("capture_cycle")
+async def capture_cycle(dut, index):
+    await step_clock(dut)
+
+
+# This function applies a list of full-chain patterns back to back.
+# Patterns are chain images (ints) or bit lists; the unloaded
+# responses come back in the same form.
+# capture(dut, index) runs with scan_en low after pattern `index`
+# has been loaded; whatever it returns is paired with the chain
+# contents unloaded afterwards. The unload of each response overlaps
+# the load of the next pattern, so N patterns cost N + 1 chain
+# traversals instead of 2N.
+#
+# `length` is passed on to shift_image() for int patterns.
+#
+# Returns a list of (unload, capture_result), one per pattern.
+
+@timed("apply_patterns")
+async def apply_patterns(dut, patterns, capture=capture_cycle, length=None):
+
+    results = []
+    captured = None
+
+    for index, pattern in enumerate(patterns):
+        if isinstance(pattern, int):
+            unload = await shift_image(dut, pattern, length)
+        else:
+            unload = await shift_chain(dut, pattern)
+        if index > 0:
+            results.append((unload, captured))
+        captured = await capture(dut, index)
+
+    if patterns:
+        if isinstance(patterns[-1], int):
+            unload = await shift_image(dut, 0, length)
+        else:
+            unload = await shift_chain(dut, [0] * len(patterns[-1]))
+        results.append((unload, captured))
+
+    return results
+
+
+#-----------------------------------------------
+
+# Splits one packed input combination over the input ports
+# (in the order given by `inputs`, first port in the low bits).
+
+def drive_inputs(dut, inputs, combo):
+    for name, width in inputs.items():
+        getattr(dut, name).value = combo & ((1 << width) - 1)
+        combo >>= width
+
+
+# This function extracts the transition table of the FSM held in
+# register `state_reg`, exploring breadth-first from `reset_state`.
+#   inputs  - {input port name: width}; every combination is applied
+#   outputs - output port names, sampled before the clock edge
+# Every state of a BFS level is expanded in one apply_patterns() run.
+# Pairs already present in `table` are not simulated again. With
+# exhaustive=True every encoding of the register is visited instead,
+# reachable or not; `states` limits that to the given encodings (one
+# shard of a split extraction, see fsm_shards.py). A wave_trace.WaveTracer passed as `tracer` records
+# each capture cycle (and nothing of the shifting) as one window.
+#
+# Returns {(state, input combo): (next state, output values)}.
+
+@timed("extract_fsm")
+async def extract_fsm(dut, chain, state_reg, inputs, outputs,
+                      reset_state=0, exhaustive=False, table=None, tracer=None,
+                      states=None):
+
+    size = chain.registers[state_reg].size
+    input_combos = 1 << sum(inputs.values())
+    table = dict() if table is None else table
+
+    if states is not None:
+        exhaustive = True
+        frontier = list(states)
+    elif exhaustive:
+        frontier = list(range(1 << size))
+    else:
+        frontier = [reset_state]
+    seen = set(frontier)
+
+    while frontier:
+        level = [(state, combo) for state in frontier for combo in range(input_combos)]
+        pairs = [pair for pair in level if pair not in table]
+
+        @timed("fsm_capture")
+        async def capture(dut, index):
+            if tracer is not None:
+                tracer.start(f"state {pairs[index][0]} input {pairs[index][1]}")
+            drive_inputs(dut, inputs, pairs[index][1])
+            await Timer(1, units='ns')  # Small delay after input change
+
+            # capture outputs BEFORE clock edge (Moore machine)
+            values = tuple(int(getattr(dut, name).value) for name in outputs)
+            await step_clock(dut)
+
+            drive_inputs(dut, inputs, 0)
+            await Timer(1, units='ns')
+            if tracer is not None:
+                tracer.stop()
+            return values
+
+        patterns = [encode_registers(chain, {state_reg: state}) for state, _ in pairs]
+        with STATS.attribute([state_reg]):
+            results = await apply_patterns(dut, patterns, capture, chain.chain_lengths)
+        for pair, (image, values) in zip(pairs, results):
+            table[pair] = (decode_registers(chain, image, [state_reg])[state_reg], values)
+
+        # next level: successors not seen yet, simulated or cached
+        frontier = list()
+        if not exhaustive:
+            for pair in level:
+                next_state = table[pair][0]
+                if next_state not in seen:
+                    seen.add(next_state)
+                    frontier.append(next_state)
+
+    return table
+
+
+#-----------------------------------------------
+
+# This function checks the adder on every a_reg/b_reg combination.
+# Patterns go through apply_patterns() back to back, `batch` at a
+# time, and the expected sums of a whole batch are computed and
+# compared with numpy in one go. Each mismatch is handed to
+# report(a, b, got, expected) as soon as its batch is done.
+# Needs numpy, which nothing else in the testbench uses.
+#
+# Returns (combinations checked, mismatches).
+
+@timed("verify_adder")
+async def verify_adder(dut, chain, batch=4096, report=None):
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("numpy required: verify_adder() (test_adder) checks the sums with numpy, "
+                          "install it with pip install numpy") from None
+
+    a_size = chain.registers["a_reg"].size
+    b_size = chain.registers["b_reg"].size
+    x_mask = (1 << chain.registers["x_out"].size) - 1
+    total = 1 << (a_size + b_size)
+    mismatches = 0
+
+    for start in range(0, total, batch):
+        combos = np.arange(start, min(start + batch, total), dtype=np.int64)
+        a = combos & ((1 << a_size) - 1)
+        b = combos >> a_size
+        patterns = [encode_registers(chain, {"a_reg": x, "b_reg": y})
+                    for x, y in zip(a.tolist(), b.tolist())]
+        with STATS.attribute(["a_reg", "b_reg", "x_out"]):
+            results = await apply_patterns(dut, patterns, length=chain.chain_lengths)
+
+        got = np.fromiter((decode_registers(chain, image, ["x_out"])["x_out"] for image, _ in results),
+                          dtype=np.int64, count=len(results))
+        expected = (a + b) & x_mask
+        bad = np.flatnonzero(got != expected)
+        mismatches += len(bad)
+        if report is not None:
+            for i in bad.tolist():
+                report(int(a[i]), int(b[i]), int(got[i]), int(expected[i]))
+
+    return total, mismatches
 
 
 #-----------------------------------------------
@@ -284,8 +964,41 @@ async def output_chain(dut, ff_index, output_length):
 #         # check result
 #         assert computed_sum == expected_result, f"Test failed: {first_input} + {second_input} = {computed_sum}, expected {expected_result}"
 
+# Exhaustive test for the adder, run with TOPLEVEL=adder.
+# ADDER_BATCH sets the patterns per batch.
+@cocotb.test(skip=os.environ.get("TOPLEVEL") != "adder")
+async def test_adder(dut):
+    global CHAIN_LENGTH
+
+    chain = setup_chain(ADDER_LOG)
+    CHAIN_LENGTH = chain.chain_length
+    STATS.clock_period_ns = CLOCK_PERIOD_NS
+
+    dut.clk.value = 0
+    dut.scan_en.value = 0
+    dut.scan_in.value = 0
+    dut.a_in.value = 0
+    dut.b_in.value = 0
+    await Timer(1, units='ns')
+
+    if os.environ.get("SCAN_CLOCK") == "free":
+        await start_clock(dut)
+    if not await gate_chain(dut, chain, {"a_in": 4, "b_in": 4}):
+        stop_clock()
+        return
+
+    def report(a, b, got, expected):
+        print(f"MISMATCH a_reg={a} b_reg={b}: x_out={got}, expected {expected}")
+
+    total, mismatches = await verify_adder(dut, chain, int(os.environ.get("ADDER_BATCH", "4096")), report)
+    stop_clock()
+    STATS.save()    # no-op unless SCAN_STATS is set
+
+    print(f"{total - mismatches}/{total} a_reg/b_reg combinations correct")
+    assert mismatches == 0, f"{mismatches} of {total} sums wrong"
+
 # Test for FSM
-@cocotb.test()
+@cocotb.test(skip=os.environ.get("TOPLEVEL") == "adder")
 async def test(dut):
     global CHAIN_LENGTH
     global FILE_NAME  
@@ -293,6 +1006,7 @@ async def test(dut):
     # Setup the scan chain object
     chain = setup_chain(FILE_NAME)
     CHAIN_LENGTH = chain.chain_length
+    STATS.clock_period_ns = CLOCK_PERIOD_NS
     
     dut.clk.value = 0
     dut.scan_en.value = 0
@@ -300,45 +1014,66 @@ async def test(dut):
     dut.data_avail.value = 0
     await Timer(1, units='ns')
 
-    # dictionary to store state transitions and outputs
-    fsm_table = {}
-
-    # loop all possible states (3-bit = 8 states)
-    for state in range(8):
-        # send the state through scan chain
-        state_bits = [(state >> i) & 1 for i in range(3)]
-        await input_chain(dut, state_bits, ff_index=0)
-        
-        await Timer(1, units='ns')  # Small delay after disabling scan
-        
-        #use both possible input values
-        for data_avail in [0, 1]:
-            dut.data_avail.value = data_avail
-            await Timer(1, units='ns')  # Small delay after input change
-            
-            # capture outputs BEFORE clock edge (Moore machine)
-            outputs = (
-                int(dut.buf_en.value),
-                int(dut.out_sel.value),
-                int(dut.out_writing.value)
-            )
-            await step_clock(dut)
-            
-            dut.scan_en.value = 1
-            await Timer(1, units='ns')  # Small delay after enabling scan
-            new_state_bits = await output_chain(dut, ff_index=0, output_length=3)
-            new_state = int("".join(map(str, new_state_bits)), 2)
-            dut.scan_en.value = 0
-            
-            fsm_table[(state, data_avail)] = (new_state, outputs)
-            
-            # Reset
-            dut.data_avail.value = 0
-            await Timer(1, units='ns')
+    if os.environ.get("SCAN_CLOCK") == "free":
+        await start_clock(dut)
+
+    if not await gate_chain(dut, chain, {"data_avail": 1}):
+        stop_clock()
+        return
+
+    # TRACE_CAPTURE=capture.vcd.gz dumps just the capture cycles
+    tracer = None
+    if os.environ.get("TRACE_CAPTURE"):
+        tracer = WaveTracer(dut, ["clk", "scan_en", "scan_in", "scan_out", "data_avail",
+                                  "buf_en", "out_sel", "out_writing"],
+                            os.environ["TRACE_CAPTURE"])
+
+    # explore the states reachable from reset; FSM_EXHAUSTIVE=1
+    # visits every encoding of cur_state instead, and
+    # FSM_SHARD_INDEX/FSM_SHARD_COUNT only this shard's slice of them
+    states = None
+    shard_count = int(os.environ.get("FSM_SHARD_COUNT", "1"))
+    if shard_count > 1:
+        shard_index = int(os.environ["FSM_SHARD_INDEX"])
+        states = fsm_table.shard_states(chain.registers["cur_state"].size, shard_index, shard_count)
+
+    # FSM_CACHE=1 takes transitions of earlier runs from the cache, so
+    # only missing pairs are simulated. The key covers the simulated
+    # sources, the .log and this testbench; without known sources
+    # nothing is cached
+    inputs = {"data_avail": 1}
+    outputs = ["buf_en", "out_sel", "out_writing"]
+    cache_key = None
+    sources = NETLIST_NAME.split()
+    if os.environ.get("FSM_CACHE") == "1":
+        if sources and all(os.path.exists(source) for source in sources):
+            cache_key = fsm_table.cache_key(sources + [FILE_NAME, __file__],
+                                            f"cur_state {inputs} {outputs}")
+        else:
+            print("FSM_CACHE=1 ignored: simulated sources unknown (set SCAN_NETLIST)")
+    table = fsm_table.load_cached(cache_key) if cache_key else dict()
+    cached = len(table)
+
+    table = await extract_fsm(
+        dut, chain, "cur_state",
+        inputs=inputs,
+        outputs=outputs,
+        exhaustive=os.environ.get("FSM_EXHAUSTIVE") == "1",
+        tracer=tracer,
+        states=states,
+        table=table,
+    )
+    stop_clock()
+    if cache_key:
+        fsm_table.store_cached(cache_key, table, meta={"netlist": NETLIST_NAME, "log": FILE_NAME})
+    print(f"{cached} transitions cached, {len(table) - cached} simulated")
+    if tracer is not None:
+        tracer.close()
+    STATS.save()    # no-op unless SCAN_STATS is set
+
+    # FSM_TABLE_OUT=table.json keeps the (partial) table for merging
+    if os.environ.get("FSM_TABLE_OUT"):
+        fsm_table.save_table(os.environ["FSM_TABLE_OUT"], table)
 
     #the FSM transition table
-    print("\nFSM Transition Table:")
-    print("Current State | Data Available | Next State | buf_en | out_sel | out_writing")
-    print("-------------------------------------------------------------------------------")
-    for (state, data_avail), (next_state, (be, os, ow)) in sorted(fsm_table.items()):
-        print(f"{state:13} | {data_avail:14} | {next_state:10} | {be:6} | {os:7} | {ow:10}")
+    fsm_table.print_table(table)
@@ -0,0 +1,122 @@
+# Scaling benchmark for the scan-chain helpers on synthetic designs.
+#
+# For each FF count a design and .log are generated with synth_chain,
+# then measured:
+#   log_s     cold parse + validation of the .log (chain_log.read_log)
+#   setup_s   setup_chain() with a warm .log cache
+#   setup_mb  peak Python memory of setup_chain() (tracemalloc)
+#   cycles/s  clock cycles per second through apply_patterns() on the
+#             netlist_sim model of the design
+#   pat/s     full-chain patterns per second, same run
+# The simulation columns are skipped above --sim-max-ffs, since the
+# pure-Python model evaluates the whole netlist every cycle.
+#
+#   python bench_scan.py                          # 10 .. 1M FFs
+#   python bench_scan.py --ffs 1000,10000 --chains 4 --json bench.json
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import chain_log
+import netlist_sim
+import synth_chain
+import ScanChain_starter as sc
+
+
+DEFAULT_FFS = "10,100,1000,10000,100000,1000000"
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def _peak_mb(func, *args):
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1] / (1 << 20)
+    finally:
+        tracemalloc.stop()
+
+
+# Shifts `count` random patterns through the netlist_sim model.
+# Returns (cycles/s, patterns/s).
+
+def _simulate(sv_path, chain, count):
+    netlist = netlist_sim.parse_netlist(sv_path)
+    sim = netlist_sim.Simulator(netlist)
+    for name in ("clk", "scan_en", "scan_in"):
+        sim.write(name, 0)
+
+    sc.Timer = netlist_sim.Timer
+    sc.CHAIN_LENGTH = chain.chain_length
+    rng = random.Random(0)
+    patterns = [rng.getrandbits(chain.chain_length) for _ in range(count)]
+
+    start_cycles = sim.cycles
+    start = time.perf_counter()
+    netlist_sim.run_coroutine(sc.apply_patterns(sim.dut, patterns, length=chain.chain_lengths), sim)
+    wall = time.perf_counter() - start
+    return (sim.cycles - start_cycles) / wall, count / wall
+
+
+def bench_size(out_dir, ffs, registers, chains, patterns, sim_max_ffs):
+    sv_path, log_path = synth_chain.generate(out_dir, ffs, registers, chains)
+
+    row = {"ffs": ffs, "chains": chains}
+    _, row["log_s"] = _timed(chain_log.read_log, log_path)
+    sc.setup_chain(log_path)    # fills the .log cache (SCAN_CACHE_DIR)
+    chain, row["setup_s"] = _timed(sc.setup_chain, log_path)
+    row["setup_mb"] = _peak_mb(sc.setup_chain, log_path)
+    row["registers"] = len(chain.registers)
+
+    if ffs <= sim_max_ffs:
+        row["cycles_per_s"], row["patterns_per_s"] = _simulate(sv_path, chain, patterns)
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scan-chain scaling benchmark on synthetic designs.")
+    parser.add_argument("--ffs", default=DEFAULT_FFS, help="comma-separated FF counts")
+    parser.add_argument("--registers", type=int, help="registers per design (default ffs/32)")
+    parser.add_argument("--chains", type=int, default=1, help="scan chains per design")
+    parser.add_argument("--patterns", type=int, default=8, help="patterns per simulation run")
+    parser.add_argument("--sim-max-ffs", type=int, default=1000, help="largest design to simulate")
+    parser.add_argument("--json", help="append the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    rows = list()
+    print(f"{'FFs':>9} {'chains':>6} {'regs':>7} {'log_s':>8} {'setup_s':>8} "
+          f"{'setup_mb':>9} {'cycles/s':>10} {'pat/s':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for ffs in (int(n) for n in args.ffs.split(",")):
+            registers = None if args.registers is None else min(args.registers, ffs)
+            row = bench_size(os.path.join(tmp, str(ffs)), ffs, registers,
+                             min(args.chains, ffs), args.patterns, args.sim_max_ffs)
+            rows.append(row)
+            sim = (f"{row['cycles_per_s']:10.0f} {row['patterns_per_s']:9.2f}"
+                   if "cycles_per_s" in row else f"{'-':>10} {'-':>9}")
+            print(f"{ffs:9} {row['chains']:6} {row['registers']:7} {row['log_s']:8.3f} "
+                  f"{row['setup_s']:8.3f} {row['setup_mb']:9.1f} {sim}", flush=True)
+
+    if args.json:
+        history = list()
+        if os.path.exists(args.json):
+            with open(args.json) as f:
+                history = json.load(f)
+        history.append({"time": time.strftime("%Y-%m-%d %H:%M:%S"), "results": rows})
+        with open(args.json, "w") as f:
+            json.dump(history, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
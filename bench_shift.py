@@ -0,0 +1,87 @@
+# Shift throughput benchmark: Timer-driven step_clock() vs the
+# free-running clock from start_clock().
+#
+# Runs against whatever design testbench.mk builds; point SCAN_LOG at
+# the matching .log file:
+#
+#   make -f testbench.mk MODULE=bench_shift
+#   SCAN_LOG=adder/adder.log make -f testbench.mk MODULE=bench_shift \
+#       TOPLEVEL=adder VERILOG_SOURCES=$PWD/adder/adder_out.sv
+#
+# netlist_sim only honours Timer waits, so there just the Timer mode
+# runs:
+#
+#   python netlist_sim.py hidden_fsm/hidden_fsm_out.sv bench_shift -t bench_timer_clock
+#
+# Each test prints simulated cycles per wall-clock second for a burst
+# of random full-chain patterns (scan_in changes every cycle) and a
+# constant zero flush (scan_in held, one await in free-running mode).
+# Results are also appended to bench_output.txt.
+
+import os
+import random
+import time
+
+import cocotb
+from cocotb.triggers import Timer
+
+import ScanChain_starter as sc
+from scan_stats import sim_ns
+
+
+PATTERNS     = int(os.environ.get("BENCH_PATTERNS", "200"))
+FLUSH_CYCLES = int(os.environ.get("BENCH_FLUSH", "20000"))
+
+
+async def setup(dut):
+    chain = sc.setup_chain(os.environ.get("SCAN_LOG", sc.FILE_NAME))
+    sc.CHAIN_LENGTH = chain.chain_length
+    dut.clk.value = 0
+    dut.scan_en.value = 0
+    dut.scan_in.value = 0
+    await Timer(1, units='ns')
+    return chain
+
+
+# Runs `coro` and reports how many clock periods of simulated time it
+# covered per second of host time.
+async def measure(label, mode, coro):
+    sim_start = sim_ns()
+    wall_start = time.perf_counter()
+    await coro
+    wall = time.perf_counter() - wall_start
+    cycles = (sim_ns() - sim_start) / sc.CLOCK_PERIOD_NS
+    line = (f"{os.environ.get('TOPLEVEL', '?'):12} {mode:6} {label:8} "
+            f"{cycles:10.0f} cycles {wall:8.3f} s {cycles / wall:12.0f} cycles/s")
+    print(line)
+    with open("bench_output.txt", "a") as f:
+        f.write(line + "\n")
+
+
+async def flush(dut, cycles):
+    dut.scan_en.value = 1
+    dut.scan_in.value = 0
+    await sc.step_clocks(dut, cycles)
+    dut.scan_en.value = 0
+
+
+async def run_bench(dut, mode):
+    chain = await setup(dut)
+    rng = random.Random(0)
+    patterns = [rng.getrandbits(chain.chain_length) for _ in range(PATTERNS)]
+
+    if mode == "free":
+        await sc.start_clock(dut)
+    await measure("patterns", mode, sc.apply_patterns(dut, patterns))
+    await measure("flush", mode, flush(dut, FLUSH_CYCLES))
+    sc.stop_clock()
+
+
+@cocotb.test()
+async def bench_timer_clock(dut):
+    await run_bench(dut, "timer")
+
+
+@cocotb.test()
+async def bench_free_clock(dut):
+    await run_bench(dut, "free")
@@ -0,0 +1,155 @@
+# Streaming parser and binary cache for scan-chain .log files.
+#
+# A .log line is "index name bit [chain]". read_log() streams the file
+# once, checks that the chain IDs run 0..C-1 without gaps, that every
+# chain holds indices 0..N-1 exactly once and every register bits
+# 0..size-1 exactly once, and packs the result into flat arrays.
+# load_log() keeps that result in a cache file keyed by the SHA-256 of
+# the .log, so later runs skip parsing altogether.
+
+import array
+import hashlib
+import os
+import pickle
+
+
+CACHE_DIR     = os.environ.get("SCAN_CACHE_DIR", ".scan_cache")
+CACHE_VERSION = 2
+
+
+class ChainLogError(Exception):
+    pass
+
+
+# Compact, array-backed view of a .log file.
+# Entries are grouped by register (in order of first appearance) and
+# sorted by bit, so register r owns entries starts[r]..starts[r]+sizes[r]-1.
+
+class ChainIndex:
+
+    def __init__(self) -> None:
+        self.names = list()                 # Register names
+        self.starts = array.array("L")      # First entry of each register
+        self.sizes = array.array("L")       # Number of bits of each register
+        self.index = array.array("L")       # Chain index of each entry
+        self.chain = array.array("L")       # Chain ID of each entry
+        self.chain_lengths = list()         # Number of FFs in each chain
+
+    def __len__(self):
+        return len(self.index)
+
+
+def _mark(seen, position, what, lineno):
+    if position >= len(seen):
+        seen.extend(bytes(position + 1 - len(seen)))
+    if seen[position]:
+        raise ChainLogError(f"line {lineno}: duplicate {what}")
+    seen[position] = 1
+
+
+def _check_complete(seen, what):
+    missing = seen.find(0)
+    if missing >= 0:
+        raise ChainLogError(f"{what} is missing position {missing}")
+
+
+# Parses and validates a .log file. Returns a ChainIndex.
+
+def read_log(filename):
+    reg_ids = dict()
+    entries_reg = array.array("L")
+    entries_bit = array.array("L")
+    entries_index = array.array("L")
+    entries_chain = array.array("L")
+    chain_seen = list()
+    reg_seen = list()
+
+    with open(filename, "r") as f:
+        for lineno, line in enumerate(f, 1):
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            if len(fields) not in (3, 4):
+                raise ChainLogError(f"line {lineno}: expected 'index name bit [chain]'")
+            try:
+                index, bit = int(fields[0]), int(fields[2])
+                chain_id = int(fields[3]) if len(fields) == 4 else 0
+            except ValueError:
+                raise ChainLogError(f"line {lineno}: non-numeric field") from None
+            if index < 0 or bit < 0 or chain_id < 0:
+                raise ChainLogError(f"line {lineno}: negative field")
+
+            reg = reg_ids.get(fields[1])
+            if reg is None:
+                reg = reg_ids[fields[1]] = len(reg_ids)
+                reg_seen.append(bytearray())
+            while len(chain_seen) <= chain_id:
+                chain_seen.append(bytearray())
+
+            _mark(chain_seen[chain_id], index, f"index {index} in chain {chain_id}", lineno)
+            _mark(reg_seen[reg], bit, f"bit {bit} of {fields[1]}", lineno)
+
+            entries_reg.append(reg)
+            entries_bit.append(bit)
+            entries_index.append(index)
+            entries_chain.append(chain_id)
+
+    for chain_id, seen in enumerate(chain_seen):
+        if not seen:
+            raise ChainLogError(f"chain {chain_id} has no FFs (chain IDs must run 0..{len(chain_seen) - 1})")
+        _check_complete(seen, f"chain {chain_id}")
+    for name, reg in reg_ids.items():
+        _check_complete(reg_seen[reg], f"register {name}")
+
+    result = ChainIndex()
+    result.names = list(reg_ids)
+    result.chain_lengths = [len(seen) for seen in chain_seen]
+    start = 0
+    for seen in reg_seen:
+        result.starts.append(start)
+        result.sizes.append(len(seen))
+        start += len(seen)
+
+    # counting sort into (register, bit) order
+    result.index = array.array("L", bytes(result.index.itemsize * len(entries_index)))
+    result.chain = array.array("L", bytes(result.chain.itemsize * len(entries_chain)))
+    starts = result.starts
+    for reg, bit, index, chain_id in zip(entries_reg, entries_bit, entries_index, entries_chain):
+        position = starts[reg] + bit
+        result.index[position] = index
+        result.chain[position] = chain_id
+
+    return result
+
+
+def file_hash(filename):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Returns the ChainIndex of a .log file, from the cache when the
+# file's contents have been seen before. cache_dir=None disables it.
+
+def load_log(filename, cache_dir=CACHE_DIR):
+    if cache_dir is None:
+        return read_log(filename)
+
+    path = os.path.join(cache_dir, f"{file_hash(filename)}.idx")
+    try:
+        with open(path, "rb") as f:
+            version, result = pickle.load(f)
+        if version == CACHE_VERSION:
+            return result
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+        pass
+
+    result = read_log(filename)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump((CACHE_VERSION, result), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return result
@@ -0,0 +1,173 @@
+# Scan-chain map extraction from a scan-inserted Yosys netlist.
+#
+# The netlist is parsed with scan_en tied to 1, so constant folding
+# reduces the D input of every scan flop to either a scan_in bit or the
+# Q of the flop before it. The chain is then a linked list: starting at
+# scan_in[k], repeatedly take the one flop whose D is the current node.
+# That walk is linear in the number of flops; parsing dominates.
+#
+# Flops get the most readable name among the nets that carry their Q:
+# a non-port name without a leading underscore (cur_state[1] over
+# _the_state[1], b_reg[3] over scan_out), then any name without one,
+# then the flop's own register name.
+#
+#   python chain_map.py adder/adder_out.sv                   # print the .log
+#   python chain_map.py adder/adder_out.sv -o adder/adder.log
+#   python chain_map.py adder/adder_out.sv --check adder/adder.log
+
+import argparse
+import re
+import sys
+
+import chain_log
+from netlist_sim import parse_netlist
+
+
+class ChainMapError(Exception):
+    pass
+
+
+_INDEXED = re.compile(r"^(.*)\[(\d+)\]$")
+
+
+# Register name and bit of bit `bit` of net `net` ("b_reg[3]" -> b_reg 3).
+
+def _register_bit(netlist, net, bit):
+    match = _INDEXED.match(net)
+    if match and netlist.widths[net] == 1:
+        return match.group(1), int(match.group(2))
+    return net, bit
+
+
+# node -> [(net, bit)] for every net bit carrying a flop output.
+
+def _aliases(netlist):
+    q_nodes = {flop.q for flop in netlist.flops}
+    aliases = dict()
+    for net, nodes in netlist.nets.items():
+        for bit, node in enumerate(nodes):
+            if node in q_nodes:
+                aliases.setdefault(node, list()).append((net, bit))
+    return aliases
+
+
+def _pick_name(netlist, flop, candidates):
+    ports = set(netlist.ports)
+    for wanted in (lambda n: n not in ports and not n.startswith("_"),
+                   lambda n: not n.startswith("_")):
+        for net, bit in candidates:
+            if wanted(net):
+                return _register_bit(netlist, net, bit)
+    return _register_bit(netlist, flop.name, flop.bit)
+
+
+# Returns one list per scan chain (chain k starts at scan_in[k]) of
+# (register name, bit), index 0 nearest scan_in.
+
+def extract_chains(netlist, scan_in="scan_in", scan_out="scan_out"):
+    for port in (scan_in, scan_out):
+        if port not in netlist.nets:
+            raise ChainMapError(f"{netlist.name} has no {port} port")
+
+    by_d = dict()
+    for flop in netlist.flops:
+        if flop.d in by_d:
+            other = by_d[flop.d]
+            raise ChainMapError(f"{other.name}[{other.bit}] and {flop.name}[{flop.bit}] "
+                                f"load the same node in scan mode")
+        by_d[flop.d] = flop
+
+    aliases = _aliases(netlist)
+    outputs = netlist.nets[scan_out]
+    chains = list()
+    placed = 0
+    for k, node in enumerate(netlist.nets[scan_in]):
+        chain = list()
+        while node in by_d:
+            flop = by_d.pop(node)
+            chain.append(_pick_name(netlist, flop, aliases.get(flop.q, ())))
+            node = flop.q
+        if not chain:
+            raise ChainMapError(f"no flop is loaded from {scan_in}[{k}] in scan mode")
+        if k >= len(outputs) or outputs[k] != node:
+            raise ChainMapError(f"chain {k} ends at {chain[-1][0]}[{chain[-1][1]}], "
+                                f"which does not drive {scan_out}[{k}]")
+        chains.append(chain)
+        placed += len(chain)
+
+    if placed != len(netlist.flops):
+        print(f"warning: {len(netlist.flops) - placed} flop(s) are not on a scan chain",
+              file=sys.stderr)
+    return chains
+
+
+def map_netlist(filename, top=None):
+    return extract_chains(parse_netlist(filename, top, constants={"scan_en": 1}))
+
+
+def log_lines(chains):
+    multi = len(chains) > 1
+    for k, chain in enumerate(chains):
+        for index, (name, bit) in enumerate(chain):
+            yield f"{index} {name} {bit}" + (f" {k}" if multi else "")
+
+
+# Differences between extracted chains and an existing .log, as
+# human-readable lines (empty when they agree).
+
+def compare_log(chains, filename):
+    log = chain_log.read_log(filename)
+    existing = dict()
+    for reg, name in enumerate(log.names):
+        for bit in range(log.sizes[reg]):
+            position = log.starts[reg] + bit
+            existing[(log.chain[position], log.index[position])] = (name, bit)
+
+    problems = list()
+    if len(log.chain_lengths) != len(chains):
+        problems.append(f"{len(chains)} chain(s) in the netlist, {len(log.chain_lengths)} in {filename}")
+    for k, chain in enumerate(chains):
+        if k < len(log.chain_lengths) and log.chain_lengths[k] != len(chain):
+            problems.append(f"chain {k}: {len(chain)} flops in the netlist, "
+                            f"{log.chain_lengths[k]} in {filename}")
+        for index, entry in enumerate(chain):
+            logged = existing.get((k, index))
+            if logged is not None and logged != entry:
+                problems.append(f"chain {k} index {index}: netlist has {entry[0]} {entry[1]}, "
+                                f"{filename} has {logged[0]} {logged[1]}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract the scan-chain .log map from a netlist.")
+    parser.add_argument("netlist", help="scan-inserted Yosys netlist (*_out.sv)")
+    parser.add_argument("--top", help="top module name, if the file has several")
+    parser.add_argument("-o", "--output", help="write the .log here instead of stdout")
+    parser.add_argument("--check", metavar="LOG", help="compare against an existing .log")
+    args = parser.parse_args(argv)
+
+    try:
+        chains = map_netlist(args.netlist, args.top)
+    except ChainMapError as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+
+    if args.check:
+        problems = compare_log(chains, args.check)
+        for line in problems:
+            print(line)
+        print(f"{args.check}: {'MISMATCH' if problems else 'OK'} "
+              f"({sum(len(c) for c in chains)} flops, {len(chains)} chain(s))")
+        return 1 if problems else 0
+
+    text = "".join(line + "\n" for line in log_lines(chains))
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
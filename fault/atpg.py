@@ -0,0 +1,122 @@
+# Compact stuck-at test generation for a gate-level netlist.
+#
+# Every candidate pattern (all input combinations when there are few
+# inputs, a seeded random sample otherwise) is fault simulated once
+# with fault_sim, which gives a detection matrix: one lane int per
+# fault, bit p set when pattern p detects it. A greedy set cover then
+# keeps taking the pattern that detects the most faults not covered
+# yet, and a reverse pass drops every pick whose faults are all caught
+# by the others. Faults that no candidate detects are reported as
+# undetectable; with exhaustive candidates that means redundant logic.
+#
+# Vectors come out in pick order, so the first ones catch the most
+# faults.
+#
+#   python atpg.py                         # fault_golden.sv
+#   python atpg.py fault_golden.sv -o vectors.json
+
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fault_sim import GOLDEN, detected_lanes, enumerate_faults, exhaustive_patterns, output_values, simulate
+from netlist_sim import parse_netlist
+
+
+MAX_EXHAUSTIVE_INPUTS = 16
+
+
+# Patterns to choose from: every input combination up to
+# MAX_EXHAUSTIVE_INPUTS input bits, else `samples` random ones.
+
+def candidate_patterns(netlist, samples=4096, seed=0):
+    widths = [netlist.widths[name] for name in netlist.inputs]
+    if sum(widths) <= MAX_EXHAUSTIVE_INPUTS:
+        return exhaustive_patterns(netlist)
+    rng = random.Random(seed)
+    return [tuple(rng.getrandbits(width) for width in widths) for _ in range(samples)]
+
+
+# Returns (good, {fault: lanes of the patterns that detect it}).
+
+def detection_matrix(netlist, patterns, faults=None):
+    good, responses = simulate(netlist, patterns, faults)
+    return good, {fault: detected_lanes(good, response) for fault, response in responses.items()}
+
+
+# Greedy set cover over the detection matrix. Returns the indices of
+# the chosen patterns, in pick order.
+
+def compact(matrix, count):
+    uncovered = [lanes for lanes in matrix.values() if lanes]
+    chosen = list()
+    while uncovered:
+        best = max(range(count), key=lambda p: sum((lanes >> p) & 1 for lanes in uncovered))
+        chosen.append(best)
+        uncovered = [lanes for lanes in uncovered if not (lanes >> best) & 1]
+
+    # a later pick may cover everything an earlier one was taken for
+    kept = sum(1 << p for p in chosen)
+    for p in reversed(chosen):
+        others = kept & ~(1 << p)
+        if all(lanes & others for lanes in matrix.values() if lanes):
+            kept = others
+    return [p for p in chosen if (kept >> p) & 1]
+
+
+# Generates a compact test set for the netlist. Returns a dict with
+# the chosen patterns (tuples ordered like "inputs"), their fault-free
+# outputs, the fault counts, the coverage in percent and the names of
+# the undetectable faults.
+
+def generate_tests(netlist, samples=4096, seed=0):
+    candidates = candidate_patterns(netlist, samples, seed)
+    faults = enumerate_faults(netlist)
+    good, matrix = detection_matrix(netlist, candidates, faults)
+    chosen = compact(matrix, len(candidates))
+
+    expected = output_values(netlist, good, len(candidates))
+    chosen_lanes = sum(1 << p for p in chosen)
+    detected = sum(1 for lanes in matrix.values() if lanes & chosen_lanes)
+    return {
+        "inputs": list(netlist.inputs),
+        "outputs": list(netlist.outputs),
+        "patterns": [tuple(candidates[p]) for p in chosen],
+        "expected": [tuple(expected[p]) for p in chosen],
+        "candidates": len(candidates),
+        "faults": len(faults),
+        "detected": detected,
+        "coverage": 100.0 * detected / len(faults) if faults else 100.0,
+        "undetectable": [fault.name for fault in faults if not matrix[fault]],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact stuck-at test set of a gate-level netlist.")
+    parser.add_argument("netlist", nargs="?", default=GOLDEN)
+    parser.add_argument("--samples", type=int, default=4096, help="random candidates for wide netlists")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write the test set as JSON")
+    args = parser.parse_args(argv)
+
+    tests = generate_tests(parse_netlist(args.netlist, fault_sites=True), args.samples, args.seed)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(tests, f, indent=1)
+
+    print(f"{' '.join(tests['inputs'])} | {' '.join(tests['outputs'])}")
+    for pattern, values in zip(tests["patterns"], tests["expected"]):
+        print(f"{' '.join(map(str, pattern))} | {' '.join(map(str, values))}")
+    print(f"\n{len(tests['patterns'])} vectors (from {tests['candidates']} candidates), "
+          f"fault coverage {tests['coverage']:.1f}% ({tests['detected']}/{tests['faults']})")
+    for name in tests["undetectable"]:
+        print(f"  undetectable: {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
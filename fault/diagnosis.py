@@ -0,0 +1,72 @@
+# Signature-indexed fault diagnosis.
+#
+# The full response of a circuit to a pattern set is packed into one
+# int: pattern p starts at bit p * width, with the output ports packed
+# after each other at their own widths. Faults with the same signature
+# are indistinguishable by that pattern set and form one equivalence
+# class, so the index is a dict from signature to class and an
+# observed response resolves with a single lookup. Responses that
+# match no single fault (multiple faults, marginal parts) fall back to
+# the classes at the smallest Hamming distance.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fault_sim import fault_dictionary
+
+
+def _popcount(x):
+    return bin(x).count("1")
+
+
+class DiagnosisIndex:
+
+    def __init__(self, dictionary) -> None:
+        self.patterns = [tuple(p) for p in dictionary["patterns"]]
+        self.output_widths = list(dictionary["output_widths"])
+        self.width = sum(self.output_widths)
+        self.good = self.signature(dictionary["good"])
+        self.classes = dict()       # signature -> [fault names]
+        for name, entry in dictionary["faults"].items():
+            self.classes.setdefault(self.signature(entry["response"]), list()).append(name)
+
+    @classmethod
+    def from_netlist(cls, netlist, patterns=None):
+        return cls(fault_dictionary(netlist, patterns))
+
+    # Packs per-pattern output values (one tuple per pattern, one value
+    # per output port) into a signature.
+    def signature(self, responses):
+        sig = 0
+        for p, values in enumerate(responses):
+            shift = p * self.width
+            for value, width in zip(values, self.output_widths):
+                sig |= (int(value) & ((1 << width) - 1)) << shift
+                shift += width
+        return sig
+
+    # Faults whose signature is exactly `sig`, or [] if none.
+    def lookup(self, sig):
+        return self.classes.get(sig, [])
+
+    # Returns (distance, [fault names]) for an observed response: the
+    # exact equivalence class at distance 0, otherwise every class at
+    # the smallest Hamming distance. A fault-free response gives (0, []).
+    def diagnose(self, responses):
+        sig = responses if isinstance(responses, int) else self.signature(responses)
+        if sig == self.good:
+            return 0, []
+        exact = self.classes.get(sig)
+        if exact is not None:
+            return 0, list(exact)
+
+        best, candidates = None, list()
+        for class_sig, names in self.classes.items():
+            distance = _popcount(class_sig ^ sig)
+            if best is None or distance < best:
+                best, candidates = distance, list(names)
+            elif distance == best:
+                candidates.extend(names)
+        return best, candidates
@@ -0,0 +1,23 @@
+/* Fault-free reference for fault1.sv .. fault5.sv, gate by gate as in fault_circuit.png */
+
+module fault(a, b, c, d, x);
+  input a;
+  wire a;
+  input b;
+  wire b;
+  input c;
+  wire c;
+  input d;
+  wire d;
+  output x;
+  wire x;
+  wire not_a;
+  wire not_c;
+  wire xor_out;
+  wire or_out;
+  assign not_a = ~a;
+  assign xor_out = not_a ^ b;
+  assign not_c = ~c;
+  assign or_out = not_c | d;
+  assign x = xor_out & or_out;
+endmodule
@@ -0,0 +1,192 @@
+# Bit-parallel stuck-at fault simulator.
+#
+# Every named net bit of a gate-level netlist is a fault site, stuck at
+# 0 and at 1. Netlists must be parsed with fault_sites=True, so that
+# each net driven by logic has a node of its own and only plain
+# wire-to-wire assigns share a node (and a fault). All patterns are
+# simulated at once: each node value is a packed int with one bit
+# ("lane") per pattern. The good machine is evaluated once, then each
+# fault re-evaluates only its fanout cone with the faulty node forced
+# to all-zeros or all-ones.
+#
+#   python fault_sim.py fault_golden.sv            # print the dictionary
+#   python fault_sim.py fault_golden.sv -o db.json # save it as JSON
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from netlist_sim import CONST1, NetlistError, parse_netlist, pack_lanes
+
+
+GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fault_golden.sv")
+
+
+# A single stuck-at fault. Nets that resolve to the same node (plain
+# wire-to-wire assigns) share one fault; the others are kept as aliases.
+
+class Fault:
+
+    def __init__(self, net, node, stuck, aliases=()) -> None:
+        self.net = net              # Net name, with [bit] for vectors
+        self.node = node            # Netlist node the fault forces
+        self.stuck = stuck          # 0 or 1
+        self.aliases = list(aliases)
+
+    @property
+    def name(self):
+        return f"{self.net} stuck-at-{self.stuck}"
+
+    def __repr__(self):
+        return f"Fault({self.name!r})"
+
+
+# Returns every stuck-at fault of the netlist, ports first, in
+# declaration order.
+
+def enumerate_faults(netlist):
+    if not netlist.fault_sites:
+        raise NetlistError(f"{netlist.name}: parse with fault_sites=True for fault simulation")
+    names = list(netlist.ports) + [n for n in netlist.nets if n not in netlist.ports]
+    by_node = dict()
+    for name in names:
+        bits = netlist.nets[name]
+        for i, node in enumerate(bits):
+            if node <= CONST1:
+                continue    # tied off, no fault site
+            label = name if len(bits) == 1 else f"{name}[{i}]"
+            by_node.setdefault(node, list()).append(label)
+
+    faults = list()
+    for node, labels in by_node.items():
+        for stuck in (0, 1):
+            faults.append(Fault(labels[0], node, stuck, labels[1:]))
+    return faults
+
+
+# Every input combination, as tuples ordered like netlist.inputs,
+# counting with the first input as the most significant bit.
+
+def exhaustive_patterns(netlist):
+    widths = [netlist.widths[name] for name in netlist.inputs]
+    patterns = list()
+    for value in range(1 << sum(widths)):
+        pattern = list()
+        for width in reversed(widths):
+            pattern.append(value & ((1 << width) - 1))
+            value >>= width
+        patterns.append(tuple(reversed(pattern)))
+    return patterns
+
+
+# Simulates the good machine and every fault against all patterns.
+# Returns (good, responses): good[out] and responses[fault][out] are
+# lists of per-bit lane ints for each output port.
+
+def simulate(netlist, patterns, faults=None):
+    if faults is None:
+        faults = enumerate_faults(netlist)
+    mask = (1 << len(patterns)) - 1
+
+    values = netlist.new_values()
+    for port, column in zip(netlist.inputs, zip(*patterns)):
+        for node, lanes in zip(netlist.nets[port], pack_lanes(column, netlist.widths[port])):
+            values[node] = lanes
+    netlist.evaluate(values, mask)
+
+    good = {out: [values[n] for n in netlist.nets[out]] for out in netlist.outputs}
+    responses = dict()
+    for fault in faults:
+        forced = {fault.node: mask if fault.stuck else 0}
+        faulty = netlist.evaluate_cone(netlist.fanout_cone(fault.node), values, mask, forced)
+        responses[fault] = {
+            out: [faulty.get(n, values[n]) for n in netlist.nets[out]]
+            for out in netlist.outputs
+        }
+    return good, responses
+
+
+# Lane ints of every output -> per-pattern output values, as tuples
+# ordered like netlist.outputs.
+
+def output_values(netlist, lanes, count):
+    columns = list()
+    for out in netlist.outputs:
+        bits = lanes[out]
+        columns.append([sum(((vec >> p) & 1) << i for i, vec in enumerate(bits))
+                        for p in range(count)])
+    return [tuple(values) for values in zip(*columns)]
+
+
+# Lanes (patterns) on which a fault changes any output.
+
+def detected_lanes(good, response):
+    lanes = 0
+    for out, bits in good.items():
+        for g, f in zip(bits, response[out]):
+            lanes |= g ^ f
+    return lanes
+
+
+# Builds the complete fault dictionary of a netlist: for every fault,
+# the output values it produces on each pattern.
+
+def fault_dictionary(netlist, patterns=None):
+    if patterns is None:
+        patterns = exhaustive_patterns(netlist)
+    good, responses = simulate(netlist, patterns)
+    faults = dict()
+    for fault, response in responses.items():
+        lanes = detected_lanes(good, response)
+        faults[fault.name] = {
+            "aliases": fault.aliases,
+            "response": [list(v) for v in output_values(netlist, response, len(patterns))],
+            "detected_by": [p for p in range(len(patterns)) if (lanes >> p) & 1],
+        }
+    return {
+        "inputs": list(netlist.inputs),
+        "outputs": list(netlist.outputs),
+        "output_widths": [netlist.widths[out] for out in netlist.outputs],
+        "patterns": [list(p) for p in patterns],
+        "good": [list(v) for v in output_values(netlist, good, len(patterns))],
+        "faults": faults,
+    }
+
+
+# Turns a fault dictionary into {input string: [fault names]} listing the
+# faults each failing vector points at, as used by fault_tb.py.
+
+def failing_vector_db(dictionary):
+    db = dict()
+    for p, pattern in enumerate(dictionary["patterns"]):
+        key = "".join(str(v) for v in pattern)
+        db[key] = [name for name, entry in dictionary["faults"].items()
+                   if p in entry["detected_by"]]
+    return db
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stuck-at fault dictionary of a gate-level netlist.")
+    parser.add_argument("netlist", nargs="?", default=GOLDEN)
+    parser.add_argument("-o", "--output", help="write the dictionary as JSON")
+    args = parser.parse_args(argv)
+
+    netlist = parse_netlist(args.netlist, fault_sites=True)
+    dictionary = fault_dictionary(netlist)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(dictionary, f, indent=1)
+
+    print(f"{len(dictionary['faults'])} faults x {len(dictionary['patterns'])} patterns")
+    print("Input | Faults detected")
+    print("----------------------")
+    for key, names in failing_vector_db(dictionary).items():
+        print(f"{key}  | {', '.join(names) if names else '-'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,5 +3,29 @@ VERILOG_SOURCES = $(shell pwd)/fault4.sv
 TOPLEVEL = fault
 MODULE = fault_tb
 SIM = verilator
-EXTRA_ARGS += --trace -Wno-WIDTHTRUNC -Wno-UNOPTFLAT -Wno-fatal
+EXTRA_ARGS += -Wno-WIDTHTRUNC -Wno-UNOPTFLAT -Wno-fatal
+
+# Full-run waveforms: TRACE=vcd (dump.vcd) or TRACE=fst (compressed
+# dump.fst). Off by default; see wave_trace.py for windowed dumps.
+# EXTRA_ARGS also reach the model at run time, but it only starts
+# dumping on a plain --trace, hence the SIM_ARGS for FST.
+TRACE ?= none
+ifeq ($(TRACE),vcd)
+EXTRA_ARGS += --trace
+else ifeq ($(TRACE),fst)
+EXTRA_ARGS += --trace-fst
+SIM_ARGS += --trace
+endif
+
+# Each compiled model lives in its own directory, keyed by a hash of
+# the source contents, TOPLEVEL and the compile options (including the
+# VERILATOR_TRACE and VERILATOR_SIM_DEBUG switches Makefile.verilator
+# turns into COMPILE_ARGS later), so switching designs reuses an
+# earlier build instead of recompiling.
+BUILD_CACHE ?= build_cache
+BUILD_KEY := $(shell { cat $(VERILOG_SOURCES); \
+	echo '$(TOPLEVEL) $(EXTRA_ARGS) $(COMPILE_ARGS) trace=$(VERILATOR_TRACE) debug=$(VERILATOR_SIM_DEBUG)'; } \
+	| sha256sum | cut -c1-16)
+SIM_BUILD ?= $(BUILD_CACHE)/$(TOPLEVEL)-$(BUILD_KEY)
+
 include $(shell cocotb-config --makefiles)/Makefile.sim
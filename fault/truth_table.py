@@ -0,0 +1,130 @@
+# Truth tables of the combinational fault netlists, without a simulator
+# build.
+#
+# Each netlist is parsed with netlist_sim and evaluated once on every
+# input combination at the same time (one packed lane per minterm, as
+# in fault_sim). The table of each faulty design is diffed against the
+# golden netlist to list its failing minterms, and the full response
+# is looked up in the golden fault dictionary (diagnosis.py) to name
+# the stuck-at faults that explain it.
+#
+#   python truth_table.py                       # fault1.sv .. fault5.sv
+#   python truth_table.py fault3.sv --table     # also print the table
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from diagnosis import DiagnosisIndex
+from fault_sim import GOLDEN, exhaustive_patterns, fault_dictionary, output_values, simulate
+from netlist_sim import parse_netlist
+
+
+class PortMismatch(Exception):
+    pass
+
+
+# Holds the complete truth table of a netlist: rows[m] are the output
+# values (ordered like netlist.outputs) on minterm m, whose input values
+# are patterns[m] (see fault_sim.exhaustive_patterns).
+
+class TruthTable:
+
+    def __init__(self, netlist) -> None:
+        self.inputs = list(netlist.inputs)
+        self.outputs = list(netlist.outputs)
+        self.patterns = exhaustive_patterns(netlist)
+
+        good, _ = simulate(netlist, self.patterns, faults=[])
+        self.lanes = good           # Output port -> per-bit lane ints
+        self.rows = output_values(netlist, good, len(self.patterns))
+
+    @classmethod
+    def from_file(cls, filename, top=None):
+        return cls(parse_netlist(filename, top))
+
+    # Input values of minterm m as a string, e.g. "0110" for a, b, c, d.
+    def minterm(self, m):
+        return "".join(str(v) for v in self.patterns[m])
+
+
+# Minterms on which `faulty` differs from `golden` on any output bit,
+# found by XORing the lanes of both tables.
+
+def failing_minterms(golden, faulty):
+    if golden.inputs != faulty.inputs or golden.outputs != faulty.outputs:
+        raise PortMismatch(f"ports {golden.inputs} -> {golden.outputs} vs "
+                           f"{faulty.inputs} -> {faulty.outputs}")
+    lanes = 0
+    for out, bits in golden.lanes.items():
+        for g, f in zip(bits, faulty.lanes[out]):
+            lanes |= g ^ f
+    return [m for m in range(len(golden.patterns)) if (lanes >> m) & 1]
+
+
+# Classifies every design in `filenames` against the golden netlist.
+# Returns {filename: (failing minterms, diagnosis distance, fault
+# names)}; the distance is 0 for an exact single-fault match.
+
+def classify(filenames, golden_file=GOLDEN):
+    netlist = parse_netlist(golden_file, fault_sites=True)
+    golden = TruthTable(netlist)
+    index = DiagnosisIndex(fault_dictionary(netlist, golden.patterns))
+
+    results = dict()
+    for filename in filenames:
+        table = TruthTable.from_file(filename)
+        failing = failing_minterms(golden, table)
+        distance, candidates = index.diagnose(table.rows) if failing else (0, [])
+        results[filename] = (failing, distance, candidates)
+    return results
+
+
+def print_table(golden, table):
+    print(f"{''.join(golden.inputs)} | {' '.join(golden.outputs)} | golden")
+    for m, (row, good) in enumerate(zip(table.rows, golden.rows)):
+        mark = "" if row == good else "  <-"
+        print(f"{table.minterm(m)} | {' '.join(map(str, row))} | {' '.join(map(str, good))}{mark}")
+
+
+def main(argv=None):
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Diff fault netlists against the golden truth table.")
+    parser.add_argument("netlists", nargs="*", help="faulty netlists (default fault*.sv next to this script)")
+    parser.add_argument("--golden", default=GOLDEN, help="fault-free reference netlist")
+    parser.add_argument("--table", action="store_true", help="print each full truth table")
+    args = parser.parse_args(argv)
+
+    filenames = args.netlists or sorted(glob.glob(os.path.join(here, "fault[0-9]*.sv")))
+    start = time.perf_counter()
+    try:
+        results = classify(filenames, args.golden)
+    except PortMismatch as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - start
+
+    golden = TruthTable.from_file(args.golden)
+    for filename, (failing, distance, candidates) in results.items():
+        print(f"\n{os.path.basename(filename)}: {len(failing)} failing minterm(s)")
+        if args.table:
+            print_table(golden, TruthTable.from_file(filename))
+        if not failing:
+            continue
+        print(f"  minterms: {', '.join(golden.minterm(m) for m in failing)}")
+        if distance == 0:
+            print(f"  exact match: {', '.join(candidates)}")
+        else:
+            print(f"  no single fault matches; nearest ({distance} bit(s)): {', '.join(candidates)}")
+
+    print(f"\n{len(results)} design(s) classified in {elapsed * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+# Sharded FSM extraction.
+#
+# Splits every encoding of cur_state over N independent simulator
+# processes (FSM_SHARD_INDEX/FSM_SHARD_COUNT, see the FSM test in
+# ScanChain_starter), then merges their partial tables into one:
+#
+#   python fsm_shards.py -n 32                     # Verilator, via make
+#   python fsm_shards.py -n 8 --backend netlist    # netlist_sim, no compile
+#
+# With the make backend shard 0 runs first so that the model is
+# compiled once into the shared build cache; the others then start
+# together. Each shard runs in its own directory under --out.
+
+import argparse
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import fsm_table
+import regress
+
+
+ROOT = regress.ROOT
+
+
+def _shard_env(index, count, out_dir, netlist="hidden_fsm/hidden_fsm_out.sv"):
+    return {
+        "FSM_SHARD_INDEX": str(index),
+        "FSM_SHARD_COUNT": str(count),
+        "FSM_TABLE_OUT": os.path.join(out_dir, f"shard{index}", "fsm_table.json"),
+        "SCAN_LOG": os.path.join(ROOT, "hidden_fsm/hidden_fsm.log"),
+        "SCAN_NETLIST": os.path.join(ROOT, netlist),
+    }
+
+
+def run_make_shards(count, out_dir, parallel, make_args):
+    jobs = [regress.Job(f"shard{i}", ["hidden_fsm/hidden_fsm_out.sv"], "hidden_fsm",
+                        "ScanChain_starter", ".", env=_shard_env(i, count, out_dir))
+            for i in range(count)]
+    codes = [regress.run_job(jobs[0], out_dir, make_args)[1]]
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as pool:
+        codes += [code for _, code, _ in
+                  pool.map(lambda job: regress.run_job(job, out_dir, make_args), jobs[1:])]
+    return codes
+
+
+def run_netlist_shard(index, count, out_dir, netlist):
+    shard_dir = os.path.join(out_dir, f"shard{index}")
+    os.makedirs(shard_dir, exist_ok=True)
+    env = dict(os.environ)
+    env.update(_shard_env(index, count, out_dir, netlist))
+    env["PYTHONPATH"] = os.pathsep.join([ROOT] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+    command = [sys.executable, os.path.join(ROOT, "netlist_sim.py"),
+               os.path.join(ROOT, netlist), "ScanChain_starter", "-t", "test"]
+    with open(os.path.join(shard_dir, "run.log"), "w") as log:
+        return subprocess.call(command, cwd=shard_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract the FSM table with N parallel shards.")
+    parser.add_argument("-n", "--shards", type=int, default=os.cpu_count(), help="number of shards")
+    parser.add_argument("-j", "--parallel", type=int, default=os.cpu_count(), help="concurrent processes")
+    parser.add_argument("--backend", choices=("make", "netlist"), default="make")
+    parser.add_argument("--netlist", default="hidden_fsm/hidden_fsm_out.sv", help="netlist for --backend netlist")
+    parser.add_argument("--out", default="fsm_shards_out", help="per-shard output root")
+    parser.add_argument("-o", "--output", default="fsm_table.json", help="merged table")
+    parser.add_argument("make_args", nargs="*", help="extra make variables")
+    args = parser.parse_args(argv)
+
+    out_dir = os.path.abspath(args.out)
+    for index in range(args.shards):
+        stale = _shard_env(index, args.shards, out_dir)["FSM_TABLE_OUT"]
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    if args.backend == "make":
+        codes = run_make_shards(args.shards, out_dir, args.parallel, args.make_args)
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as pool:
+            codes = list(pool.map(lambda i: run_netlist_shard(i, args.shards, out_dir, args.netlist),
+                                  range(args.shards)))
+
+    tables, failed = list(), list()
+    for index, code in enumerate(codes):
+        path = _shard_env(index, args.shards, out_dir)["FSM_TABLE_OUT"]
+        if code != 0 or not os.path.exists(path):
+            failed.append(index)
+            continue
+        tables.append(fsm_table.load_table(path)[0])
+    if failed:
+        print(f"shards {', '.join(map(str, failed))} failed; see {out_dir}/shard<N>/")
+        return 1
+
+    table = fsm_table.merge_tables(tables)
+    fsm_table.save_table(args.output, table, {"shards": args.shards})
+    fsm_table.print_table(table)
+    print(f"\n{len(table)} transitions from {args.shards} shards, merged into {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
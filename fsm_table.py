@@ -0,0 +1,109 @@
+# FSM transition tables from extract_fsm() on disk.
+#
+# A table maps (state, input combo) -> (next state, output values). It
+# is stored as JSON with one [state, combo, next state, [outputs]] row
+# per transition, plus free-form metadata. Partial tables from shards
+# or earlier runs are combined with merge_tables().
+#
+# With FSM_CACHE=1 tables are also cached on disk (FSM_CACHE_DIR,
+# default .fsm_cache), keyed by a hash of the simulated netlist, the
+# .log, the testbench code and the extraction setup, so a re-run on an
+# unchanged design simulates nothing and a partial table is only
+# extended.
+
+import hashlib
+import json
+import os
+
+
+CACHE_DIR = os.environ.get("FSM_CACHE_DIR", ".fsm_cache")
+
+
+class FsmTableConflict(Exception):
+    pass
+
+
+def save_table(filename, table, meta=None):
+    rows = [[state, combo, next_state, list(values)]
+            for (state, combo), (next_state, values) in sorted(table.items())]
+    tmp_path = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"meta": meta or dict(), "transitions": rows}, f, indent=1)
+    os.replace(tmp_path, filename)
+
+
+# Returns (table, meta).
+
+def load_table(filename):
+    with open(filename) as f:
+        data = json.load(f)
+    table = {(state, combo): (next_state, tuple(values))
+             for state, combo, next_state, values in data["transitions"]}
+    return table, data.get("meta", dict())
+
+
+# Union of several tables. The same (state, input) pair with different
+# results means the extraction is not deterministic, which is an error.
+
+def merge_tables(tables):
+    merged = dict()
+    for table in tables:
+        for pair, result in table.items():
+            known = merged.setdefault(pair, result)
+            if known != result:
+                raise FsmTableConflict(f"state {pair[0]} input {pair[1]}: {known} vs {result}")
+    return merged
+
+
+# States of an n-bit register handled by shard `index` of `count`.
+# Strided, so every shard gets a similar mix of low and high encodings.
+
+def shard_states(size, index, count):
+    if not 0 <= index < count:
+        raise ValueError(f"shard index {index} out of range for {count} shards")
+    return range(index, 1 << size, count)
+
+
+def print_table(table):
+    print("\nFSM Transition Table:")
+    print("Current State | Data Available | Next State | buf_en | out_sel | out_writing")
+    print("-------------------------------------------------------------------------------")
+    for (state, data_avail), (next_state, (be, sel, ow)) in sorted(table.items()):
+        print(f"{state:13} | {data_avail:14} | {next_state:10} | {be:6} | {sel:7} | {ow:10}")
+
+
+# Cache key of an extraction: SHA-256 over the contents of `files`
+# (netlist sources and .log) and `setup`, a string naming the state
+# register, inputs and outputs.
+
+def cache_key(files, setup=""):
+    digest = hashlib.sha256()
+    for filename in files:
+        with open(filename, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        digest.update(b"\0")
+    digest.update(setup.encode())
+    return digest.hexdigest()
+
+
+def _cache_path(key, cache_dir):
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+# Cached table for `key`, or an empty one.
+
+def load_cached(key, cache_dir=CACHE_DIR):
+    try:
+        return load_table(_cache_path(key, cache_dir))[0]
+    except (OSError, ValueError, KeyError):
+        return dict()
+
+
+# Adds `table` to the cache entry of `key`, keeping anything another
+# run stored in the meantime.
+
+def store_cached(key, table, cache_dir=CACHE_DIR, meta=None):
+    os.makedirs(cache_dir, exist_ok=True)
+    merged = merge_tables([load_cached(key, cache_dir), table])
+    save_table(_cache_path(key, cache_dir), merged, meta)
@@ -0,0 +1,1234 @@
+# Pure-Python cycle-accurate simulator for the Yosys scan netlists
+# (hidden_fsm/hidden_fsm_out.sv, adder/adder_out.sv, fault/faultN.sv).
+#
+# The netlist is parsed and bit-blasted into a levelized graph of
+# single-bit AND/OR/XOR/NOT/MUX nodes plus DFFs. Every node value is a
+# Python int used as a packed vector of "lanes", so the same graph runs
+# one cycle of one design (lanes = 1) or thousands of input patterns at
+# once (see fault/fault_sim.py).
+#
+# Running a cocotb testbench without a Verilator build:
+#
+#   python netlist_sim.py hidden_fsm/hidden_fsm_out.sv ScanChain_starter
+#
+# The testbench coroutines run unchanged against a `dut` object with the
+# usual dut.<signal>.value handles; Timer() waits only advance the
+# simulation time, since a zero-delay netlist settles immediately.
+
+import argparse
+import importlib
+import inspect
+import os
+import re
+import sys
+
+
+class NetlistError(Exception):
+    pass
+
+
+#-------------------------------------------------------------------
+# Tokenizer
+
+_COMMENT_RE = re.compile(r"/\*.*?\*/|//[^\n]*|\(\*\s.*?\s\*\)", re.S)
+_TOKEN_RE = re.compile(r"""
+      (?P<esc>\\\S+)
+    | (?P<num>\d*\s*'[sS]?[bBoOdDhH]\s*[0-9a-fA-FxXzZ?_]+ | \d+)
+    | (?P<id>[A-Za-z_$][A-Za-z0-9_$]*)
+    | (?P<op>===|!==|<<<|>>>|==|!=|<=|>=|&&|\|\||<<|>>|~&|~\||~\^|\^~
+            |[-+*/%&|^~!<>=?:;,.(){}\[\]@\#])
+    | (?P<ws>\s+)
+    """, re.X)
+
+
+def _tokenize(text):
+    text = _COMMENT_RE.sub(" ", text)
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        m = _TOKEN_RE.match(text, pos)
+        if m is None:
+            raise NetlistError(f"unexpected character {text[pos]!r}")
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == "ws":
+            continue
+        if kind == "esc":
+            tokens.append(("id", m.group()[1:]))
+        else:
+            tokens.append((kind, m.group()))
+    tokens.append(("eof", ""))
+    return tokens
+
+
+# Returns (value, width, dont_care_mask) for a Verilog number literal.
+# x/z/? digits read as 0 and are flagged in the don't-care mask, which
+# only casez/casex patterns look at.
+def _parse_number(text):
+    text = text.replace("_", "").replace(" ", "")
+    if "'" not in text:
+        return int(text), 32, 0
+    size, rest = text.split("'")
+    width = int(size) if size else 32
+    rest = rest.lstrip("sS")
+    base, digits = rest[0].lower(), rest[1:].lower()
+    if base == "d":
+        if digits in ("x", "z", "?"):
+            return 0, width, (1 << width) - 1
+        return int(digits) & ((1 << width) - 1), width, 0
+    step = {"b": 1, "o": 3, "h": 4}[base]
+    value = dc = 0
+    for ch in digits:
+        value <<= step
+        dc <<= step
+        if ch in "xz?":
+            dc |= (1 << step) - 1
+        else:
+            value |= int(ch, 16)
+    mask = (1 << width) - 1
+    return value & mask, width, dc & mask
+
+
+#-------------------------------------------------------------------
+# Parser: builds a small AST for one flat module.
+#
+# Expressions are tuples:
+#   ("id", name)  ("num", value, width, dc)  ("sel", name, msb, lsb)
+#   ("concat", [items])  ("repl", count, [items])  ("un", op, e)
+#   ("bin", op, a, b)  ("tern", c, a, b)  ("call", name, [args])
+# Statements:
+#   ("block", [stmts])  ("if", c, then, else)  ("case", kind, e, items)
+#   ("assign", lhs, rhs)
+
+_BINARY_PREC = {
+    "||": 1, "&&": 2, "|": 3, "~|": 3, "^": 4, "~^": 4, "^~": 4,
+    "&": 5, "~&": 5, "==": 6, "!=": 6, "===": 6, "!==": 6,
+    "<": 7, "<=": 7, ">": 7, ">=": 7, "<<": 8, ">>": 8, "<<<": 8,
+    ">>>": 8, "+": 9, "-": 9, "*": 10,
+}
+
+
+class _Module:
+
+    def __init__(self, name):
+        self.name = name
+        self.ports = list()         # Port names in header order
+        self.directions = dict()    # Port name -> "input"/"output"/"inout"
+        self.nets = dict()          # Net name -> (msb, lsb)
+        self.assigns = list()       # (lhs, rhs) continuous assignments
+        self.always = list()        # ([(edge, clock net)], stmt)
+        self.initials = list()      # stmt
+        self.functions = dict()     # name -> (msb, lsb, [(input, msb, lsb)], stmt)
+
+
+class _Parser:
+
+    def __init__(self, text):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def peek(self, offset=0):
+        return self.tokens[self.pos + offset]
+
+    def next(self):
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def accept(self, text):
+        if self.tokens[self.pos][1] == text and self.tokens[self.pos][0] != "id":
+            self.pos += 1
+            return True
+        return False
+
+    def accept_kw(self, word):
+        if self.tokens[self.pos] == ("id", word):
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, text):
+        tok = self.next()
+        if tok[1] != text:
+            raise NetlistError(f"expected {text!r}, got {tok[1]!r}")
+        return tok
+
+    def ident(self):
+        tok = self.next()
+        if tok[0] != "id":
+            raise NetlistError(f"expected identifier, got {tok[1]!r}")
+        return tok[1]
+
+    # -- module level ---------------------------------------------
+
+    def parse_modules(self):
+        modules = list()
+        while self.peek()[0] != "eof":
+            if not self.accept_kw("module"):
+                raise NetlistError(f"expected 'module', got {self.peek()[1]!r}")
+            modules.append(self.parse_module())
+        return modules
+
+    def parse_module(self):
+        mod = _Module(self.ident())
+        if self.accept("("):
+            if not self.accept(")"):
+                while True:
+                    mod.ports.append(self.ident())
+                    if self.accept(")"):
+                        break
+                    self.expect(",")
+        self.expect(";")
+
+        while not self.accept_kw("endmodule"):
+            word = self.ident()
+            if word in ("input", "output", "inout", "wire", "reg"):
+                self.parse_decl(mod, word)
+            elif word == "assign":
+                lhs = self.parse_expr()
+                self.expect("=")
+                mod.assigns.append((lhs, self.parse_expr()))
+                self.expect(";")
+            elif word == "always":
+                mod.always.append((self.parse_sensitivity(), self.parse_stmt()))
+            elif word == "initial":
+                mod.initials.append(self.parse_stmt())
+            elif word == "function":
+                self.parse_function(mod)
+            else:
+                raise NetlistError(f"unsupported module item {word!r}")
+        return mod
+
+    def parse_range(self):
+        if not self.accept("["):
+            return 0, 0
+        msb = _const_int(self.parse_expr())
+        self.expect(":")
+        lsb = _const_int(self.parse_expr())
+        self.expect("]")
+        return msb, lsb
+
+    def parse_decl(self, mod, word):
+        direction = word if word in ("input", "output", "inout") else None
+        while self.peek()[1] in ("wire", "reg", "logic", "signed"):
+            self.next()
+        msb, lsb = self.parse_range()
+        while True:
+            name = self.ident()
+            if self.peek()[1] == "[":
+                raise NetlistError(f"memories are not supported ({name})")
+            mod.nets[name] = (msb, lsb)
+            if direction:
+                mod.directions[name] = direction
+            if self.accept("="):
+                init = self.parse_expr()
+                if word == "reg":
+                    mod.initials.append(("assign", ("id", name), init))
+                else:
+                    mod.assigns.append((("id", name), init))
+            if self.accept(";"):
+                return
+            self.expect(",")
+
+    def parse_sensitivity(self):
+        self.expect("@")
+        self.expect("(")
+        edges = list()
+        while True:
+            edge = self.ident()
+            if edge not in ("posedge", "negedge"):
+                raise NetlistError("only edge-triggered always blocks are supported")
+            edges.append((edge, self.ident()))
+            if self.accept(")"):
+                break
+            if not self.accept(","):
+                self.expect("or")
+        if len(edges) != 1:
+            raise NetlistError("asynchronous set/reset flops are not supported")
+        return edges
+
+    def parse_function(self, mod):
+        msb, lsb = self.parse_range()
+        name = self.ident()
+        self.expect(";")
+        inputs = list()
+        body = list()
+        while not self.accept_kw("endfunction"):
+            if self.accept_kw("input"):
+                imsb, ilsb = self.parse_range()
+                while True:
+                    inputs.append((self.ident(), imsb, ilsb))
+                    if self.accept(";"):
+                        break
+                    self.expect(",")
+            elif self.peek()[1] in ("reg", "integer"):
+                raise NetlistError(f"local variables in function {name} are not supported")
+            else:
+                body.append(self.parse_stmt())
+        mod.functions[name] = (msb, lsb, inputs, ("block", body))
+
+    # -- statements -----------------------------------------------
+
+    def parse_stmt(self):
+        if self.accept(";"):
+            return ("block", [])
+        if self.accept_kw("begin"):
+            stmts = list()
+            while not self.accept_kw("end"):
+                stmts.append(self.parse_stmt())
+            return ("block", stmts)
+        if self.accept_kw("if"):
+            self.expect("(")
+            cond = self.parse_expr()
+            self.expect(")")
+            then = self.parse_stmt()
+            other = self.parse_stmt() if self.accept_kw("else") else None
+            return ("if", cond, then, other)
+        for kind in ("case", "casez", "casex"):
+            if self.accept_kw(kind):
+                return self.parse_case(kind)
+        lhs = self.parse_primary()
+        if not (self.accept("<=") or self.accept("=")):
+            raise NetlistError(f"expected assignment, got {self.peek()[1]!r}")
+        rhs = self.parse_expr()
+        self.expect(";")
+        return ("assign", lhs, rhs)
+
+    def parse_case(self, kind):
+        self.expect("(")
+        sel = self.parse_expr()
+        self.expect(")")
+        items = list()
+        while not self.accept_kw("endcase"):
+            if self.accept_kw("default"):
+                self.accept(":")
+                items.append((None, self.parse_stmt()))
+                continue
+            patterns = [self.parse_expr()]
+            while self.accept(","):
+                patterns.append(self.parse_expr())
+            self.expect(":")
+            items.append((patterns, self.parse_stmt()))
+        return ("case", kind, sel, items)
+
+    # -- expressions ----------------------------------------------
+
+    def parse_expr(self):
+        cond = self.parse_binary(1)
+        if self.accept("?"):
+            then = self.parse_expr()
+            self.expect(":")
+            return ("tern", cond, then, self.parse_expr())
+        return cond
+
+    def parse_binary(self, min_prec):
+        lhs = self.parse_unary()
+        while True:
+            tok = self.peek()
+            prec = _BINARY_PREC.get(tok[1]) if tok[0] == "op" else None
+            if prec is None or prec < min_prec:
+                return lhs
+            self.next()
+            lhs = ("bin", tok[1], lhs, self.parse_binary(prec + 1))
+
+    def parse_unary(self):
+        tok = self.peek()
+        if tok[0] == "op" and tok[1] in ("~", "!", "&", "|", "^", "~&", "~|", "~^", "^~", "-", "+"):
+            self.next()
+            return ("un", tok[1], self.parse_unary())
+        return self.parse_primary()
+
+    def parse_primary(self):
+        tok = self.next()
+        if tok[0] == "num":
+            value, width, dc = _parse_number(tok[1])
+            return ("num", value, width, dc)
+        if tok[1] == "(" and tok[0] == "op":
+            expr = self.parse_expr()
+            self.expect(")")
+            return expr
+        if tok[1] == "{" and tok[0] == "op":
+            first = self.parse_expr()
+            if self.accept("{"):
+                items = [self.parse_expr()]
+                while self.accept(","):
+                    items.append(self.parse_expr())
+                self.expect("}")
+                self.expect("}")
+                return ("repl", first, items)
+            items = [first]
+            while self.accept(","):
+                items.append(self.parse_expr())
+            self.expect("}")
+            return ("concat", items)
+        if tok[0] != "id":
+            raise NetlistError(f"unexpected token {tok[1]!r}")
+        name = tok[1]
+        if self.accept("("):
+            args = list()
+            if not self.accept(")"):
+                while True:
+                    args.append(self.parse_expr())
+                    if self.accept(")"):
+                        break
+                    self.expect(",")
+            return ("call", name, args)
+        if self.accept("["):
+            msb = self.parse_expr()
+            lsb = None
+            if self.accept(":"):
+                lsb = self.parse_expr()
+            self.expect("]")
+            return ("sel", name, msb, lsb)
+        return ("id", name)
+
+
+def _const_int(expr):
+    kind = expr[0]
+    if kind == "num":
+        return expr[1]
+    if kind == "un" and expr[1] == "-":
+        return -_const_int(expr[2])
+    if kind == "bin" and expr[1] in ("+", "-", "*"):
+        a, b = _const_int(expr[2]), _const_int(expr[3])
+        return {"+": a + b, "-": a - b, "*": a * b}[expr[1]]
+    raise NetlistError("expected a constant expression")
+
+
+# True for an expression that only connects nets (an identifier, a
+# bit select or a concatenation of those), i.e. a wire-to-wire assign.
+def _is_wire(expr):
+    if expr[0] in ("id", "sel"):
+        return True
+    return expr[0] == "concat" and all(_is_wire(item) for item in expr[1])
+
+
+#-------------------------------------------------------------------
+# Bit-blasted netlist
+
+CONST0 = 0
+CONST1 = 1
+
+OP_INPUT = "in"
+OP_AND = "and"
+OP_OR = "or"
+OP_XOR = "xor"
+OP_NOT = "not"
+OP_MUX = "mux"      # (s, a, b) -> s ? a : b
+OP_BUF = "buf"      # a net's own copy of its driver, see fault_sites
+
+
+class Flop:
+
+    def __init__(self, name, bit, q, clock, edge) -> None:
+        self.name = name        # Net name of the register
+        self.bit = bit          # Bit position inside that net (LSB = 0)
+        self.q = q              # Node holding the current state
+        self.d = CONST0         # Node computing the next state
+        self.clock = clock      # Clock net name
+        self.edge = edge        # "posedge" or "negedge"
+        self.init = 0           # Value after reset of the simulation
+
+
+# With fault_sites=True every net bit driven by an assign of logic
+# (not a plain wire-to-wire assign) gets a node of its own, a buffer
+# of the shared logic. Structural hashing and inversion folding still
+# merge the logic itself, but a fault forced on one net then reaches
+# only that net's fanout, as fault_sim needs.
+
+class Netlist:
+
+    def __init__(self, module, constants=None, fault_sites=False) -> None:
+        self.name = module.name
+        self.fault_sites = fault_sites
+        self.ports = list(module.ports)
+        self.inputs = [p for p in module.ports if module.directions.get(p) == "input"]
+        self.outputs = [p for p in module.ports if module.directions.get(p) == "output"]
+        self.widths = {name: abs(msb - lsb) + 1 for name, (msb, lsb) in module.nets.items()}
+
+        self.ops = [OP_INPUT, OP_INPUT]     # CONST0 and CONST1
+        self.args = [(), ()]
+        self.input_nodes = list()           # Nodes written from outside (ports)
+        self.flops = list()
+        self.nets = dict()                  # Net name -> list of nodes, LSB first
+        self.clocks = set()
+
+        self._module = module
+        self._hash = dict()
+        self._resolved = dict()
+        self._drivers = dict()
+        self._assign_bits = dict()
+        self._busy = set()
+        self._constants = constants or dict()
+        self._compiled = None
+        self._fanout = None
+
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, 20000))
+        try:
+            self._build()
+        finally:
+            sys.setrecursionlimit(limit)
+
+        del self._module, self._hash, self._resolved, self._drivers
+        del self._assign_bits, self._busy
+
+    def __len__(self):
+        return len(self.ops)
+
+    # -- node construction ----------------------------------------
+
+    def _node(self, op, *args):
+        key = (op,) + args
+        node = self._hash.get(key)
+        if node is None:
+            node = len(self.ops)
+            self.ops.append(op)
+            self.args.append(args)
+            self._hash[key] = node
+        return node
+
+    def _input(self):
+        self.ops.append(OP_INPUT)
+        self.args.append(())
+        return len(self.ops) - 1
+
+    # Never hashed: each call is a distinct node.
+    def _buf(self, a):
+        self.ops.append(OP_BUF)
+        self.args.append((a,))
+        return len(self.ops) - 1
+
+    def _not(self, a):
+        if a <= CONST1:
+            return 1 - a
+        if self.ops[a] == OP_NOT:
+            return self.args[a][0]
+        return self._node(OP_NOT, a)
+
+    def _and(self, a, b):
+        if a == CONST0 or b == CONST0:
+            return CONST0
+        if a == CONST1 or a == b:
+            return b
+        if b == CONST1:
+            return a
+        return self._node(OP_AND, min(a, b), max(a, b))
+
+    def _or(self, a, b):
+        if a == CONST1 or b == CONST1:
+            return CONST1
+        if a == CONST0 or a == b:
+            return b
+        if b == CONST0:
+            return a
+        return self._node(OP_OR, min(a, b), max(a, b))
+
+    def _xor(self, a, b):
+        if a == b:
+            return CONST0
+        if a <= CONST1:
+            return b if a == CONST0 else self._not(b)
+        if b <= CONST1:
+            return a if b == CONST0 else self._not(a)
+        return self._node(OP_XOR, min(a, b), max(a, b))
+
+    def _mux(self, s, a, b):
+        if s == CONST1 or a == b:
+            return a
+        if s == CONST0:
+            return b
+        if a == CONST1 and b == CONST0:
+            return s
+        if a == CONST0 and b == CONST1:
+            return self._not(s)
+        return self._node(OP_MUX, s, a, b)
+
+    # -- vector helpers (LSB-first lists of nodes) ------------------
+
+    @staticmethod
+    def _ext(bits, width):
+        if len(bits) >= width:
+            return bits[:width]
+        return bits + [CONST0] * (width - len(bits))
+
+    def _reduce(self, fn, bits, empty):
+        result = empty
+        for i, bit in enumerate(bits):
+            result = bit if i == 0 else fn(result, bit)
+        return result
+
+    def _bool(self, bits):
+        return self._reduce(self._or, bits, CONST0)
+
+    def _add(self, a, b, carry=CONST0):
+        width = max(len(a), len(b))
+        a, b = self._ext(a, width), self._ext(b, width)
+        out = list()
+        for x, y in zip(a, b):
+            half = self._xor(x, y)
+            out.append(self._xor(half, carry))
+            carry = self._or(self._and(x, y), self._and(half, carry))
+        return out + [carry]
+
+    def _eq(self, a, b):
+        width = max(len(a), len(b))
+        a, b = self._ext(a, width), self._ext(b, width)
+        bits = [self._not(self._xor(x, y)) for x, y in zip(a, b)]
+        return self._reduce(self._and, bits, CONST1)
+
+    def _less(self, a, b):
+        width = max(len(a), len(b))
+        diff = self._add(self._ext(a, width), [self._not(x) for x in self._ext(b, width)], CONST1)
+        return self._not(diff[width])
+
+    def _shift(self, bits, amount, left):
+        width = len(bits)
+        if all(bit <= CONST1 for bit in amount):
+            count = sum(bit << i for i, bit in enumerate(amount))
+            if count >= width:
+                return [CONST0] * width
+            if left:
+                return [CONST0] * count + bits[:width - count]
+            return bits[count:] + [CONST0] * count
+        out = list(bits)
+        for k, sel in enumerate(amount):
+            step = 1 << k
+            if left:
+                shifted = [out[i - step] if i >= step else CONST0 for i in range(width)]
+            else:
+                shifted = [out[i + step] if i + step < width else CONST0 for i in range(width)]
+            out = [self._mux(sel, s, o) for s, o in zip(shifted, out)]
+        return out
+
+    # -- elaboration ----------------------------------------------
+
+    def _position(self, name, index):
+        msb, lsb = self._module.nets[name]
+        pos = index - lsb if msb >= lsb else lsb - index
+        if not 0 <= pos <= abs(msb - lsb):
+            raise NetlistError(f"index {index} out of range for {name}")
+        return pos
+
+    def _lvalue(self, expr, scope=None):
+        kind = expr[0]
+        if kind == "concat":
+            bits = list()
+            for item in reversed(expr[1]):
+                bits.extend(self._lvalue(item, scope))
+            return bits
+        if kind == "id":
+            name = expr[1]
+            if scope is not None and name in scope:
+                return [(name, i) for i in range(scope[name])]
+            if name not in self._module.nets:
+                raise NetlistError(f"undeclared net {name}")
+            return [(name, i) for i in range(self.widths[name])]
+        if kind == "sel":
+            name = expr[1]
+            hi = _const_int(expr[2])
+            lo = hi if expr[3] is None else _const_int(expr[3])
+            if scope is not None and name in scope:
+                return [(name, i) for i in range(lo, hi + 1)]
+            a, b = self._position(name, hi), self._position(name, lo)
+            return [(name, i) for i in range(min(a, b), max(a, b) + 1)]
+        raise NetlistError("unsupported assignment target")
+
+    def _build(self):
+        mod = self._module
+
+        for name in self.inputs:
+            bits = [self._input() for _ in range(self.widths[name])]
+            for i, node in enumerate(bits):
+                self._resolved[(name, i)] = node
+            if name in self._constants:
+                value = self._constants[name]
+                for i in range(len(bits)):
+                    self._resolved[(name, i)] = CONST1 if (value >> i) & 1 else CONST0
+            self.input_nodes.extend(bits)
+
+        for index, (lhs, rhs) in enumerate(mod.assigns):
+            for pos, key in enumerate(self._lvalue(lhs)):
+                if key in self._drivers or key in self._resolved:
+                    raise NetlistError(f"multiple drivers on {key[0]}[{key[1]}]")
+                self._drivers[key] = (index, pos)
+
+        blocks = list()
+        for edges, stmt in mod.always:
+            edge, clock = edges[0]
+            targets = list()
+            self._targets(stmt, targets)
+            flops = list()
+            for key in dict.fromkeys(targets):
+                if key in self._drivers or key in self._resolved:
+                    raise NetlistError(f"multiple drivers on {key[0]}[{key[1]}]")
+                flop = Flop(key[0], key[1], self._input(), clock, edge)
+                self._resolved[key] = flop.q
+                flops.append(flop)
+            self.clocks.add(clock)
+            blocks.append((stmt, flops))
+
+        initial = dict()
+        for stmt in mod.initials:
+            self._exec(stmt, initial, None, lambda key: CONST0)
+
+        for stmt, flops in blocks:
+            state = dict()
+            hold = {(f.name, f.bit): f.q for f in flops}
+            self._exec(stmt, state, None, hold.__getitem__)
+            for flop in flops:
+                flop.d = state.get((flop.name, flop.bit), flop.q)
+                flop.init = 1 if initial.get((flop.name, flop.bit)) == CONST1 else 0
+            self.flops.extend(flops)
+
+        for name in mod.nets:
+            self.nets[name] = [self._bit(name, i) for i in range(self.widths[name])]
+
+    def _targets(self, stmt, out):
+        kind = stmt[0]
+        if kind == "block":
+            for s in stmt[1]:
+                self._targets(s, out)
+        elif kind == "if":
+            self._targets(stmt[2], out)
+            if stmt[3] is not None:
+                self._targets(stmt[3], out)
+        elif kind == "case":
+            for _, s in stmt[3]:
+                self._targets(s, out)
+        else:
+            out.extend(self._lvalue(stmt[1]))
+
+    def _bit(self, name, i):
+        node = self._resolved.get((name, i))
+        if node is not None:
+            return node
+        driver = self._drivers.get((name, i))
+        if driver is None:
+            node = CONST0       # undriven (or x) nets read as 0
+        else:
+            index, pos = driver
+            bits = self._assign_bits.get(index)
+            if bits is None:
+                if index in self._busy:
+                    raise NetlistError(f"combinational loop through {name}")
+                self._busy.add(index)
+                lhs, rhs = self._module.assigns[index]
+                width = len(self._lvalue(lhs))
+                bits = self._ext(self._blast(rhs, None), width)
+                self._busy.discard(index)
+                self._assign_bits[index] = bits
+            node = bits[pos]
+            if self.fault_sites and node > CONST1 and not _is_wire(self._module.assigns[index][1]):
+                node = self._buf(node)
+        self._resolved[(name, i)] = node
+        return node
+
+    # Symbolically executes a statement. `state` maps (name, bit) to
+    # the node assigned so far; `scope` holds function locals (name ->
+    # width), which read back their assigned values; `hold` gives the
+    # value of a target that was not assigned on some branch.
+    def _exec(self, stmt, state, scope, hold):
+        kind = stmt[0]
+        if kind == "block":
+            for s in stmt[1]:
+                self._exec(s, state, scope, hold)
+        elif kind == "assign":
+            keys = self._lvalue(stmt[1], scope)
+            bits = self._ext(self._blast(stmt[2], scope, state), len(keys))
+            for key, bit in zip(keys, bits):
+                state[key] = bit
+        elif kind == "if":
+            cond = self._bool(self._blast(stmt[1], scope, state))
+            self._branch(cond, stmt[2], stmt[3], state, scope, hold)
+        elif kind == "case":
+            self._case(stmt, 0, state, scope, hold)
+
+    def _branch(self, cond, then, other, state, scope, hold):
+        a = dict(state)
+        b = dict(state)
+        if callable(then):
+            then(a)
+        elif then is not None:
+            self._exec(then, a, scope, hold)
+        if callable(other):
+            other(b)
+        elif other is not None:
+            self._exec(other, b, scope, hold)
+        for key in set(a) | set(b):
+            x = a[key] if key in a else hold(key)
+            y = b[key] if key in b else hold(key)
+            state[key] = self._mux(cond, x, y)
+
+    def _case(self, stmt, start, state, scope, hold):
+        _, kind, sel, items = stmt
+        sel_bits = self._blast(sel, scope, state)
+        for index in range(start, len(items)):
+            patterns, body = items[index]
+            if patterns is None:
+                continue
+            match = CONST0
+            for pattern in patterns:
+                match = self._or(match, self._match(kind, sel_bits, pattern, scope, state))
+            rest = lambda s, i=index: self._case(stmt, i + 1, s, scope, hold)
+            self._branch(match, body, rest, state, scope, hold)
+            return
+        for patterns, body in items:
+            if patterns is None:
+                self._exec(body, state, scope, hold)
+
+    def _match(self, kind, sel_bits, pattern, scope, state):
+        if pattern[0] != "num" or kind == "case":
+            return self._eq(sel_bits, self._blast(pattern, scope, state))
+        _, value, width, dc = pattern
+        width = max(width, len(sel_bits))
+        match = CONST1
+        for i, bit in enumerate(self._ext(sel_bits, width)):
+            if (dc >> i) & 1:
+                continue
+            want = CONST1 if (value >> i) & 1 else CONST0
+            match = self._and(match, self._not(self._xor(bit, want)))
+        return match
+
+    # Bit-blasts an expression into its self-determined width.
+    def _blast(self, expr, scope, state=None):
+        kind = expr[0]
+
+        if kind == "num":
+            _, value, width, _ = expr
+            return [CONST1 if (value >> i) & 1 else CONST0 for i in range(width)]
+
+        if kind == "id":
+            name = expr[1]
+            if scope is not None and name in scope:
+                return [state.get((name, i), CONST0) for i in range(scope[name])]
+            if name not in self._module.nets:
+                raise NetlistError(f"undeclared net {name}")
+            return [self._bit(name, i) for i in range(self.widths[name])]
+
+        if kind == "sel":
+            name = expr[1]
+            bits = self._blast(("id", name), scope, state)
+            hi = _const_int(expr[2])
+            lo = hi if expr[3] is None else _const_int(expr[3])
+            if scope is not None and name in scope:
+                return bits[lo:hi + 1]
+            a, b = self._position(name, hi), self._position(name, lo)
+            return bits[min(a, b):max(a, b) + 1]
+
+        if kind == "concat":
+            bits = list()
+            for item in reversed(expr[1]):
+                bits.extend(self._blast(item, scope, state))
+            return bits
+
+        if kind == "repl":
+            bits = list()
+            for item in reversed(expr[2]):
+                bits.extend(self._blast(item, scope, state))
+            return bits * _const_int(expr[1])
+
+        if kind == "un":
+            op, bits = expr[1], self._blast(expr[2], scope, state)
+            if op == "~":
+                return [self._not(b) for b in bits]
+            if op == "!":
+                return [self._not(self._bool(bits))]
+            if op == "+":
+                return bits
+            if op == "-":
+                return self._add([self._not(b) for b in bits], [], CONST1)[:len(bits)]
+            fn = {"&": self._and, "~&": self._and, "|": self._or, "~|": self._or,
+                  "^": self._xor, "~^": self._xor, "^~": self._xor}[op]
+            result = self._reduce(fn, bits, CONST1 if op in ("&", "~&") else CONST0)
+            return [self._not(result) if op.startswith("~") or op == "^~" else result]
+
+        if kind == "tern":
+            cond = self._bool(self._blast(expr[1], scope, state))
+            a = self._blast(expr[2], scope, state)
+            b = self._blast(expr[3], scope, state)
+            width = max(len(a), len(b))
+            return [self._mux(cond, x, y) for x, y in zip(self._ext(a, width), self._ext(b, width))]
+
+        if kind == "call":
+            return self._call(expr[1], [self._blast(a, scope, state) for a in expr[2]])
+
+        if kind == "bin":
+            op = expr[1]
+            a = self._blast(expr[2], scope, state)
+            b = self._blast(expr[3], scope, state)
+            width = max(len(a), len(b))
+            if op in ("&", "|", "^", "~^", "^~"):
+                fn = {"&": self._and, "|": self._or}.get(op, self._xor)
+                out = [fn(x, y) for x, y in zip(self._ext(a, width), self._ext(b, width))]
+                return [self._not(x) for x in out] if op in ("~^", "^~") else out
+            if op == "&&":
+                return [self._and(self._bool(a), self._bool(b))]
+            if op == "||":
+                return [self._or(self._bool(a), self._bool(b))]
+            if op in ("==", "==="):
+                return [self._eq(a, b)]
+            if op in ("!=", "!=="):
+                return [self._not(self._eq(a, b))]
+            if op == "<":
+                return [self._less(a, b)]
+            if op == ">":
+                return [self._less(b, a)]
+            if op == "<=":
+                return [self._not(self._less(b, a))]
+            if op == ">=":
+                return [self._not(self._less(a, b))]
+            if op == "+":
+                return self._add(a, b)
+            if op == "-":
+                return self._add(self._ext(a, width), [self._not(x) for x in self._ext(b, width)], CONST1)[:width]
+            if op in ("<<", "<<<"):
+                return self._shift(a, b, True)
+            if op in (">>", ">>>"):
+                return self._shift(a, b, False)
+            raise NetlistError(f"unsupported operator {op!r}")
+
+        raise NetlistError(f"unsupported expression {kind!r}")
+
+    def _call(self, name, args):
+        if name not in self._module.functions:
+            raise NetlistError(f"unknown function {name}")
+        msb, lsb, inputs, body = self._module.functions[name]
+        scope = {name: abs(msb - lsb) + 1}
+        state = dict()
+        for (arg_name, imsb, ilsb), bits in zip(inputs, args):
+            scope[arg_name] = abs(imsb - ilsb) + 1
+            for i, bit in enumerate(self._ext(bits, scope[arg_name])):
+                state[(arg_name, i)] = bit
+        self._exec(body, state, scope, lambda key: CONST0)
+        return [state.get((name, i), CONST0) for i in range(scope[name])]
+
+    # -- evaluation -----------------------------------------------
+
+    # Returns a fresh value list; node values are packed lane ints.
+    def new_values(self):
+        return [0] * len(self.ops)
+
+    def _compile(self, chunk=2000):
+        lines = list()
+        for node, op in enumerate(self.ops):
+            args = self.args[node]
+            if op == OP_INPUT:
+                continue
+            if op == OP_NOT:
+                lines.append(f"v[{node}] = v[{args[0]}] ^ M")
+            elif op == OP_BUF:
+                lines.append(f"v[{node}] = v[{args[0]}]")
+            elif op == OP_MUX:
+                s, a, b = args
+                lines.append(f"v[{node}] = v[{b}] ^ ((v[{a}] ^ v[{b}]) & v[{s}])")
+            else:
+                sym = {OP_AND: "&", OP_OR: "|", OP_XOR: "^"}[op]
+                lines.append(f"v[{node}] = v[{args[0]}] {sym} v[{args[1]}]")
+        functions = list()
+        for start in range(0, len(lines), chunk):
+            body = "\n    ".join(lines[start:start + chunk])
+            scope = dict()
+            exec(compile(f"def _eval(v, M):\n    {body}\n", f"<{self.name}>", "exec"), scope)
+            functions.append(scope["_eval"])
+        self._compiled = functions
+
+    # Evaluates every combinational node in level order. Inputs and
+    # flop outputs must already be set in v; M is the all-lanes mask.
+    def evaluate(self, v, mask=1):
+        if self._compiled is None:
+            self._compile()
+        v[CONST0] = 0
+        v[CONST1] = mask
+        for fn in self._compiled:
+            fn(v, mask)
+        return v
+
+    def fanout(self):
+        if self._fanout is None:
+            self._fanout = [list() for _ in self.ops]
+            for node, args in enumerate(self.args):
+                for arg in set(args):
+                    self._fanout[arg].append(node)
+        return self._fanout
+
+    # Returns the nodes that depend on `node`, in evaluation order.
+    def fanout_cone(self, node):
+        fanout = self.fanout()
+        seen = {node}
+        stack = [node]
+        while stack:
+            for succ in fanout[stack.pop()]:
+                if succ not in seen:
+                    seen.add(succ)
+                    stack.append(succ)
+        seen.discard(node)
+        return sorted(seen)
+
+    # Re-evaluates `cone` with some nodes forced to fixed values.
+    # Values come from `good` unless overridden; returns the overrides.
+    def evaluate_cone(self, cone, good, mask, forced):
+        val = dict(forced)
+        ops, all_args = self.ops, self.args
+        for node in cone:
+            if node in forced:
+                continue
+            op, args = ops[node], all_args[node]
+            x = [val[a] if a in val else good[a] for a in args]
+            if op == OP_AND:
+                val[node] = x[0] & x[1]
+            elif op == OP_OR:
+                val[node] = x[0] | x[1]
+            elif op == OP_XOR:
+                val[node] = x[0] ^ x[1]
+            elif op == OP_NOT:
+                val[node] = x[0] ^ mask
+            elif op == OP_BUF:
+                val[node] = x[0]
+            elif op == OP_MUX:
+                val[node] = x[2] ^ ((x[1] ^ x[2]) & x[0])
+        return val
+
+
+#-------------------------------------------------------------------
+
+# Parses a netlist file and returns the Netlist of its (only, or
+# named) module. `constants` ties input ports to fixed values before
+# bit-blasting, which folds away the logic they control. fault_sites
+# gives every logic-driven net its own node (see Netlist).
+
+def parse_netlist(filename, top=None, constants=None, fault_sites=False):
+    with open(filename, "r") as f:
+        modules = _Parser(f.read()).parse_modules()
+    if not modules:
+        raise NetlistError(f"no module in {filename}")
+    if top is None:
+        if len(modules) > 1:
+            raise NetlistError(f"{filename} has several modules; pass top=")
+        return Netlist(modules[0], constants, fault_sites)
+    for mod in modules:
+        if mod.name == top:
+            return Netlist(mod, constants, fault_sites)
+    raise NetlistError(f"module {top} not found in {filename}")
+
+
+# Packs per-lane integer values of a net into per-bit lane vectors.
+def pack_lanes(values, width):
+    bits = [0] * width
+    for lane, value in enumerate(values):
+        for i in range(width):
+            if (value >> i) & 1:
+                bits[i] |= 1 << lane
+    return bits
+
+
+# Inverse of pack_lanes().
+def unpack_lanes(bits, lanes):
+    values = [0] * lanes
+    for i, vec in enumerate(bits):
+        for lane in range(lanes):
+            if (vec >> lane) & 1:
+                values[lane] |= 1 << i
+    return values
+
+
+#-------------------------------------------------------------------
+# cocotb-style handles
+
+class SignalHandle:
+
+    def __init__(self, sim, name) -> None:
+        self._sim = sim
+        self._name = name
+
+    @property
+    def value(self):
+        return self._sim.read(self._name)
+
+    @value.setter
+    def value(self, value):
+        self._sim.write(self._name, value)
+
+    def setimmediatevalue(self, value):
+        self._sim.write(self._name, value)
+
+    def __int__(self):
+        return self._sim.read(self._name)
+
+    def __repr__(self):
+        return f"SignalHandle({self._name!r})"
+
+
+class _Dut:
+
+    def __init__(self, sim) -> None:
+        object.__setattr__(self, "_sim", sim)
+        object.__setattr__(self, "_handles", dict())
+        object.__setattr__(self, "_name", sim.netlist.name)
+
+    def __getattr__(self, name):
+        handles = self._handles
+        if name not in handles:
+            if name not in self._sim.netlist.nets:
+                raise AttributeError(f"{self._name} has no signal {name!r}")
+            handles[name] = SignalHandle(self._sim, name)
+        return handles[name]
+
+    def __getitem__(self, name):
+        return self.__getattr__(name)
+
+
+class Simulator:
+
+    def __init__(self, netlist) -> None:
+        self.netlist = netlist
+        self.values = netlist.new_values()
+        self.time = 0.0         # Simulation time in ns
+        self.cycles = 0         # Number of active clock edges seen
+        self.dut = _Dut(self)
+        self._dirty = True
+        self._clock_flops = dict()
+        for flop in netlist.flops:
+            self._clock_flops.setdefault((flop.clock, flop.edge), list()).append(flop)
+            self.values[flop.q] = flop.init
+
+    def _settle(self):
+        if self._dirty:
+            self.netlist.evaluate(self.values)
+            self._dirty = False
+
+    def read(self, name):
+        self._settle()
+        v = self.values
+        value = 0
+        for i, node in enumerate(self.netlist.nets[name]):
+            value |= (v[node] & 1) << i
+        return value
+
+    def write(self, name, value):
+        value = int(value)
+        bits = self.netlist.nets[name]
+        if name in self.netlist.clocks:
+            old = self.values[bits[0]]
+            new = value & 1
+            if old != new:
+                self._settle()
+                self._edge(name, "posedge" if new else "negedge")
+        v = self.values
+        for i, node in enumerate(bits):
+            v[node] = (value >> i) & 1
+        self._dirty = True
+
+    def _edge(self, clock, edge):
+        flops = self._clock_flops.get((clock, edge))
+        if not flops:
+            return
+        v = self.values
+        nxt = [v[flop.d] for flop in flops]
+        for flop, bit in zip(flops, nxt):
+            v[flop.q] = bit
+        self.cycles += 1
+
+
+#-------------------------------------------------------------------
+# Minimal trigger and scheduler for running cocotb test coroutines
+
+_UNITS_NS = {"fs": 1e-6, "ps": 1e-3, "ns": 1.0, "us": 1e3, "ms": 1e6, "sec": 1e9, "step": 1e-3}
+
+
+class Timer:
+
+    def __init__(self, time=0, units="step", unit=None, **kwargs) -> None:
+        self.time = time
+        self.units = unit or units
+
+    def __await__(self):
+        yield self
+
+
+# Drives a test coroutine to completion, advancing sim.time on every
+# Timer. Any other trigger cannot be honoured by this backend.
+def run_coroutine(coro, sim):
+    try:
+        trigger = coro.send(None)
+        while True:
+            if not isinstance(trigger, Timer):
+                raise NetlistError(f"netlist_sim only supports Timer triggers, got {trigger!r}")
+            sim.time += trigger.time * _UNITS_NS.get(trigger.units, 1.0)
+            trigger = coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+
+
+def _test_function(obj):
+    for attr in ("_func", "func"):
+        fn = getattr(obj, attr, None)
+        if inspect.iscoroutinefunction(fn):
+            return fn
+    return None
+
+
+# Imports a cocotb test module, points its Timer at this backend and
+# runs its tests against a fresh Simulator each. Returns a list of
+# (test name, passed, error). `filename` is the netlist's source, made
+# known to the tests as SCAN_NETLIST.
+def run_tests(netlist, module_name, test_names=None, filename=None):
+    os.environ.setdefault("TOPLEVEL", netlist.name)
+    os.environ.setdefault("MODULE", module_name)
+    if filename is not None:
+        os.environ.setdefault("SCAN_NETLIST", os.path.abspath(filename))
+    module = importlib.import_module(module_name)
+
+    # swap cocotb's Timer for ours in every module that imported it
+    triggers = sys.modules.get("cocotb.triggers")
+    cocotb_timer = getattr(triggers, "Timer", None)
+    for mod in list(sys.modules.values()):
+        if cocotb_timer is not None and getattr(mod, "Timer", None) is cocotb_timer:
+            mod.Timer = Timer
+    module.Timer = Timer
+
+    # scan_stats reads cocotb's clock unless told otherwise
+    stats = sys.modules.get("scan_stats")
+    sim = None
+    if stats is not None:
+        stats.set_time_source(lambda: sim.time)
+
+    results = list()
+    for name, obj in vars(module).items():
+        fn = _test_function(obj)
+        if fn is None or (test_names and name not in test_names):
+            continue
+        if getattr(obj, "skip", False) and not test_names:
+            continue
+        sim = Simulator(netlist)
+        try:
+            run_coroutine(fn(sim.dut), sim)
+            results.append((name, True, None))
+        except Exception as error:  # report and keep going, like cocotb
+            results.append((name, False, error))
+        print(f"{name}: {'PASS' if results[-1][1] else 'FAIL'} "
+              f"({sim.cycles} cycles, {sim.time:.0f} ns)")
+    if stats is not None:
+        stats.set_time_source(None)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a cocotb testbench on a Yosys netlist without Verilator.")
+    parser.add_argument("netlist", help="gate-level .sv netlist (e.g. hidden_fsm/hidden_fsm_out.sv)")
+    parser.add_argument("module", help="cocotb test module (e.g. ScanChain_starter)")
+    parser.add_argument("-t", "--test", action="append", help="only run this test (repeatable)")
+    parser.add_argument("--top", help="top module name, if the file has several")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.getcwd())
+    netlist = parse_netlist(args.netlist, args.top)
+    results = run_tests(netlist, args.module, args.test, args.netlist)
+    for name, passed, error in results:
+        if not passed:
+            print(f"{name} failed: {error!r}")
+    return 0 if results and all(passed for _, passed, _ in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+# Parallel regression runner for the cocotb/Verilator flows.
+#
+# Each job is one (design sources, toplevel, test module) run through a
+# testbench.mk. Jobs run concurrently, one make process each, in their
+# own output directory (regress_out/<job>/) with their own results.xml,
+# waveform, scan statistics and make log. Compiled models go to the
+# shared build cache (build_cache/, keyed by testbench.mk); jobs that
+# would build the same model run one after the other. The per-job
+# JUnit files are merged into one report, with the scan statistics
+# (see scan_stats.py) as suite properties.
+#
+#   python regress.py                       # fault1..fault5, hidden_fsm and adder
+#   python regress.py -j 16 --job fault/fault2.sv:fault:fault_tb:fault
+#   python regress.py --jobs-file nightly.txt -o nightly.xml
+#
+# A job spec is SOURCES:TOPLEVEL:MODULE[:DIR]. SOURCES is one or more
+# paths joined with '+'; DIR holds testbench.mk and the test module
+# (default: the directory of the first source when it has a
+# testbench.mk, else the repository root). Paths are relative to the
+# repository root. The job is named after the first source's path and
+# the module, e.g. fault.fault2-fault_tb.
+
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+import json
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+from scan_stats import properties
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class Job:
+
+    def __init__(self, name, sources, toplevel, module, directory, env=None) -> None:
+        self.name = name                # Unique name, also the output directory
+        self.sources = sources          # Verilog sources, relative to ROOT
+        self.toplevel = toplevel        # TOPLEVEL for cocotb
+        self.module = module            # cocotb test module
+        self.directory = directory      # Holds testbench.mk and the module
+        self.env = env or dict()        # Extra environment variables
+
+    @classmethod
+    def parse(cls, spec):
+        fields = spec.split(":")
+        if len(fields) not in (3, 4):
+            raise ValueError(f"bad job spec {spec!r}, expected SOURCES:TOPLEVEL:MODULE[:DIR]")
+        sources = fields[0].split("+")
+        if len(fields) == 4:
+            directory = fields[3]
+        else:
+            directory = os.path.dirname(sources[0]) or "."
+            if not os.path.exists(os.path.join(ROOT, directory, "testbench.mk")):
+                directory = "."
+        path = os.path.splitext(os.path.relpath(os.path.join(ROOT, sources[0]), ROOT))[0]
+        name = f"{path.replace(os.sep, '.')}-{fields[2]}"
+        return cls(name, sources, fields[1], fields[2], directory)
+
+
+DEFAULT_JOBS = [
+    Job(f"fault{k}", [f"fault/fault{k}.sv"], "fault", "fault_tb", "fault")
+    for k in range(1, 6)
+] + [
+    Job("hidden_fsm", ["hidden_fsm/hidden_fsm_out.sv"], "hidden_fsm", "ScanChain_starter", ".",
+        env={"SCAN_LOG": os.path.join(ROOT, "hidden_fsm/hidden_fsm.log"),
+             "SCAN_NETLIST": os.path.join(ROOT, "hidden_fsm/hidden_fsm_out.sv")}),
+    Job("adder", ["adder/adder_out.sv"], "adder", "ScanChain_starter", ".",
+        env={"SCAN_LOG": os.path.join(ROOT, "adder/adder.log")}),
+]
+
+
+# Runs one job and returns (job, make exit code, results.xml path).
+def run_job(job, out_root, make_args):
+    out_dir = os.path.abspath(os.path.join(out_root, job.name))
+    os.makedirs(out_dir, exist_ok=True)
+    directory = os.path.join(ROOT, job.directory)
+    results = os.path.join(out_dir, "results.xml")
+    for stale in (results, os.path.join(out_dir, "scan_stats.json")):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    env = dict(os.environ)
+    env.update(job.env)
+    env["SCAN_STATS"] = os.path.join(out_dir, "scan_stats.json")
+    env["PYTHONPATH"] = os.pathsep.join(
+        [directory, ROOT] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+
+    command = [
+        "make", "-f", os.path.join(directory, "testbench.mk"),
+        "VERILOG_SOURCES=" + " ".join(os.path.join(ROOT, s) for s in job.sources),
+        f"TOPLEVEL={job.toplevel}",
+        f"MODULE={job.module}",
+        f"BUILD_CACHE={os.path.join(ROOT, 'build_cache')}",
+        f"COCOTB_RESULTS_FILE={results}",
+    ] + list(make_args)
+
+    with open(os.path.join(out_dir, "make.log"), "w") as log:
+        code = subprocess.call(command, cwd=out_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return job, code, results
+
+
+# Job variables that change the compile options testbench.mk hashes.
+BUILD_VARIABLES = ("TRACE", "EXTRA_ARGS", "COMPILE_ARGS", "VERILATOR_TRACE", "VERILATOR_SIM_DEBUG")
+
+
+# What testbench.mk's BUILD_KEY depends on: the source contents,
+# TOPLEVEL and the compile options. Jobs with equal keys compile into
+# the same build_cache/ directory, whatever their DIR.
+def build_key(job):
+    digest = hashlib.sha256()
+    for source in job.sources:
+        with open(os.path.join(ROOT, source), "rb") as f:
+            digest.update(f.read())
+    return (digest.hexdigest(), job.toplevel) + tuple(job.env.get(name) for name in BUILD_VARIABLES)
+
+
+# Runs a group of jobs that share a compiled model, in order.
+def run_group(group, out_root, make_args):
+    return [run_job(job, out_root, make_args) for job in group]
+
+
+# Merges per-job JUnit files into one <testsuites> document. A job that
+# produced no results.xml (e.g. a failed build) becomes a failing test.
+def merge_results(outcomes, out_root):
+    merged = ET.Element("testsuites", name="regression")
+    failed = list()
+    for job, code, results in outcomes:
+        suite = ET.SubElement(merged, "testsuite", name=job.name, package=job.module)
+        props = ET.SubElement(suite, "properties")
+        ET.SubElement(props, "property", name="sources", value=" ".join(job.sources))
+        stats = os.path.join(out_root, job.name, "scan_stats.json")
+        if os.path.exists(stats):
+            with open(stats) as f:
+                for name, value in properties(json.load(f)):
+                    ET.SubElement(props, "property", name=name, value=str(value))
+        cases = list()
+        if os.path.exists(results):
+            for case in ET.parse(results).getroot().iter("testcase"):
+                case.set("classname", f"{job.name}.{case.get('classname', job.module)}")
+                cases.append(case)
+        if not cases:
+            case = ET.Element("testcase", name="build", classname=f"{job.name}.make")
+            log = os.path.join(out_root, job.name, "make.log")
+            ET.SubElement(case, "failure", message=f"make exited with {code}, no results (see {log})")
+            cases.append(case)
+        for case in cases:
+            suite.append(case)
+            if case.find("failure") is not None or case.find("error") is not None:
+                failed.append(f"{job.name}: {case.get('name')}")
+        suite.set("tests", str(len(cases)))
+    return ET.ElementTree(merged), failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run cocotb regressions in parallel.")
+    parser.add_argument("--job", action="append", default=[], help="SOURCES:TOPLEVEL:MODULE[:DIR]")
+    parser.add_argument("--jobs-file", help="file with one job spec per line")
+    parser.add_argument("-j", "--parallel", type=int, default=os.cpu_count(), help="concurrent jobs")
+    parser.add_argument("--out", default="regress_out", help="per-job output root")
+    parser.add_argument("-o", "--results", default="regress_results.xml", help="merged JUnit report")
+    parser.add_argument("make_args", nargs="*", help="extra make variables, e.g. WAVES=0")
+    args = parser.parse_args(argv)
+
+    specs = list(args.job)
+    if args.jobs_file:
+        with open(args.jobs_file) as f:
+            specs += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    jobs = [Job.parse(spec) for spec in specs] if specs else DEFAULT_JOBS
+    names = [job.name for job in jobs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise SystemExit(f"job names must be unique: {', '.join(duplicates)}")
+
+    groups = dict()
+    for job in jobs:
+        groups.setdefault(build_key(job), list()).append(job)
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as pool:
+        results = pool.map(lambda group: run_group(group, args.out, args.make_args), groups.values())
+        outcomes = [outcome for group in results for outcome in group]
+
+    tree, failed = merge_results(outcomes, args.out)
+    tree.write(args.results, encoding="unicode", xml_declaration=False)
+
+    print(f"{len(jobs)} jobs, {len(failed)} failing test(s); merged report in {args.results}")
+    for line in failed:
+        print(f"  FAIL {line}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
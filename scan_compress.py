@@ -0,0 +1,242 @@
+# Scan compression model: a few tester channels drive many internal
+# chains through a linear decompressor, and the chain outputs are
+# XOR-compacted back down to a few response channels.
+#
+# The decompressor is an LFSR with the channel bits XORed into it every
+# cycle and a phase shifter (XOR of a few state bits per chain) on its
+# outputs, as in EDT-style compression. Everything is linear over
+# GF(2), so each chain bit is the XOR of a known subset of the stimulus
+# bits. encode() uses that to solve for a stimulus that reproduces the
+# care bits of a partially specified pattern; don't-care bits take
+# whatever the decompressor produces.
+#
+# A pattern for K chains of length <= L loads in warmup + L cycles
+# instead of the sum of the chain lengths on a single scan_in:
+#
+#   decomp = Decompressor(channels=2, chains=len(chain.chain_lengths))
+#   stimulus = encode(decomp, chain.chain_lengths, image, care_mask)
+#   response = await shift_compressed(dut, decomp, compactor, stimulus,
+#                                     chain.chain_lengths)
+#
+#   python scan_compress.py --chains 32 --channels 2 --length 256 --care 0.05
+
+import argparse
+import random
+import sys
+
+from scan_stats import timed
+
+
+def _parity(x):
+    return bin(x).count("1") & 1
+
+
+class Decompressor:
+
+    def __init__(self, channels, chains, state_width=None, taps_per_chain=3, seed=1) -> None:
+        self.channels = channels            # Tester input channels
+        self.chains = chains                # Internal scan chains driven
+        self.width = state_width or max(64, 2 * channels)
+        self.warmup = -(-self.width // channels)    # Cycles to fill the state
+
+        rng = random.Random(seed)
+        self.feedback = sorted(rng.sample(range(self.width), 4))   # LFSR taps into bit 0
+        self.inject = [(c * self.width) // channels for c in range(channels)]
+        self.phase = [sorted(rng.sample(range(self.width), taps_per_chain))
+                      for _ in range(chains)]
+
+    # Advances `state` (a list of width entries, ints) by one cycle with
+    # the given per-channel inputs, in place. Works both for concrete
+    # bits and for GF(2) linear forms (ints used as variable sets).
+    def _step(self, state, inputs):
+        new0 = 0
+        for tap in self.feedback:
+            new0 ^= state[tap]
+        state[1:] = state[:-1]
+        state[0] = new0
+        for position, value in zip(self.inject, inputs):
+            state[position] ^= value
+
+    def _outputs(self, state):
+        words = list()
+        for taps in self.phase:
+            value = 0
+            for tap in taps:
+                value ^= state[tap]
+            words.append(value)
+        return words
+
+    # Concrete chain input words, one per cycle: bit k drives chain k.
+    # `stimulus` holds channel bits, bit cycle * channels + c.
+    def expand(self, stimulus, cycles):
+        state = [0] * self.width
+        mask = (1 << self.channels) - 1
+        for cycle in range(cycles):
+            word = (stimulus >> (cycle * self.channels)) & mask
+            self._step(state, [(word >> c) & 1 for c in range(self.channels)])
+            yield sum(bit << k for k, bit in enumerate(self._outputs(state)))
+
+    # Linear forms of the chain inputs: yields, per cycle, a list with
+    # one int per chain whose set bits are the stimulus bits it XORs.
+    def forms(self, cycles):
+        state = [0] * self.width
+        for cycle in range(cycles):
+            base = cycle * self.channels
+            self._step(state, [1 << (base + c) for c in range(self.channels)])
+            yield self._outputs(state)
+
+    def cycles(self, lengths):
+        return self.warmup + max(lengths)
+
+
+# Space compactor: response channel j is the XOR of the chains k with
+# k % outputs == j.
+
+class Compactor:
+
+    def __init__(self, chains, outputs) -> None:
+        self.chains = chains
+        self.outputs = outputs
+
+    def compact(self, word, valid=None):
+        if valid is not None:
+            word &= valid
+        result = 0
+        for k in range(self.chains):
+            result ^= ((word >> k) & 1) << (k % self.outputs)
+        return result
+
+    # Compacted response words expected when the chains hold `image`
+    # (chain k at image offset sum(lengths[:k])), one per unload cycle.
+    def expected(self, image, lengths):
+        offsets = list()
+        offset = 0
+        for length in lengths:
+            offsets.append(offset)
+            offset += length
+        words = list()
+        for cycle in range(max(lengths)):
+            word = 0
+            for k, length in enumerate(lengths):
+                if cycle < length:
+                    word |= ((image >> (offsets[k] + length - 1 - cycle)) & 1) << k
+            words.append(self.compact(word))
+        return words
+
+
+class EncodingError(Exception):
+    pass
+
+
+# Solves for a stimulus that loads the chains with `image` on every bit
+# set in `care` (image layout as in ScanChain.chain_offsets).
+# Gaussian elimination over GF(2) with one int per equation; free
+# variables are filled from `seed` so don't-care bits are random rather
+# than all zero. Raises EncodingError if the care bits conflict.
+
+def encode(decomp, lengths, image, care, seed=0):
+    total = decomp.cycles(lengths)
+    offsets = list()
+    offset = 0
+    for length in lengths:
+        offsets.append(offset)
+        offset += length
+
+    # chain k, FF index -> cycle total-1-index; collect the care bits
+    # per cycle so the forms are walked once
+    wanted = dict()
+    for k, length in enumerate(lengths):
+        for index in range(length):
+            position = offsets[k] + index
+            if (care >> position) & 1:
+                wanted.setdefault(total - 1 - index, list()).append((k, (image >> position) & 1))
+
+    pivots = dict()     # leading variable -> (row, rhs)
+    for cycle, forms in enumerate(decomp.forms(total)):
+        for k, value in wanted.get(cycle, ()):
+            row, rhs = forms[k], value
+            while row:
+                lead = row.bit_length() - 1
+                if lead not in pivots:
+                    pivots[lead] = (row, rhs)
+                    break
+                prow, prhs = pivots[lead]
+                row ^= prow
+                rhs ^= prhs
+            else:
+                if rhs:
+                    raise EncodingError(f"care bit of chain {k} at cycle {cycle} conflicts")
+
+    variables = total * decomp.channels
+    stimulus = random.Random(seed).getrandbits(variables) if variables else 0
+    for lead in sorted(pivots):
+        row, rhs = pivots[lead]
+        # the row only involves `lead` and lower variables
+        bit = rhs ^ _parity(row & stimulus & ((1 << lead) - 1))
+        stimulus = (stimulus & ~(1 << lead)) | (bit << lead)
+    return stimulus
+
+
+# Shifts one compressed pattern in while unloading the previous
+# contents through the compactor. The decompressor's words drive the
+# scan_in bus (bit k = chain k); chain k only contributes to the
+# compactor while it still holds unload data. Returns the compacted
+# response words.
+
+@timed("shift_compressed")
+async def shift_compressed(dut, decomp, compactor, stimulus, lengths):
+    from ScanChain_starter import step_clock
+
+    longest = max(lengths)
+    response = list()
+    dut.scan_en.value = 1
+    for cycle, in_word in enumerate(decomp.expand(stimulus, decomp.cycles(lengths))):
+        if cycle < longest:
+            valid = sum(1 << k for k, length in enumerate(lengths) if cycle < length)
+            response.append(compactor.compact(int(dut.scan_out.value), valid))
+        dut.scan_in.value = in_word
+        await step_clock(dut)
+    dut.scan_en.value = 0
+    return response
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Encoding rate and cycle savings of the compression model.")
+    parser.add_argument("--chains", type=int, default=32)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--length", type=int, default=128, help="FFs per internal chain")
+    parser.add_argument("--care", type=float, default=0.02, help="fraction of specified bits")
+    parser.add_argument("--patterns", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    decomp = Decompressor(args.channels, args.chains)
+    lengths = [args.length] * args.chains
+    ffs = sum(lengths)
+    cycles = decomp.cycles(lengths)
+    rng = random.Random(0)
+    encoded = 0
+    for _ in range(args.patterns):
+        care = sum(1 << i for i in range(ffs) if rng.random() < args.care)
+        image = rng.getrandbits(ffs)
+        try:
+            stimulus = encode(decomp, lengths, image, care)
+        except EncodingError:
+            continue
+        loaded = 0
+        for cycle, word in enumerate(decomp.expand(stimulus, cycles)):
+            index = cycles - 1 - cycle
+            if index < args.length:
+                for k in range(args.chains):
+                    loaded |= ((word >> k) & 1) << (k * args.length + index)
+        assert (loaded ^ image) & care == 0
+        encoded += 1
+
+    print(f"{ffs} FFs on {args.chains} chains, {args.channels} channels, care {args.care:.1%}")
+    print(f"encoded {encoded}/{args.patterns} patterns")
+    print(f"shift cycles {cycles} vs {ffs} on one chain ({ffs / cycles:.1f}x)")
+    print(f"tester bits/pattern {cycles * args.channels} vs {ffs} ({ffs / (cycles * args.channels):.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+# Offline scan-chain state reconstruction from a VCD dump.
+#
+# A dump of a scan test (TRACE=vcd, or a wave_trace window) holds every
+# clk/scan_en/scan_in/scan_out transition, which is enough to recover
+# what was shifted in and out of the chain without re-simulating:
+#
+#   python scan_replay.py dump.vcd hidden_fsm/hidden_fsm.log
+#   python scan_replay.py dump.vcd.gz adder/adder.log --loads -r a_reg,b_reg
+#
+# The file is streamed one line at a time. Every run of rising clk edges
+# with scan_en high is one scan operation. The bits coming out of
+# scan_out during the run are the chain contents at its start (the
+# "unload"); the last bits shifted in are the contents at its end (the
+# "load"). Both are turned into register values with the ScanChain map
+# from setup_chain(). Bits a short run never reached print as x.
+#
+# scan_out is sampled before the changes of an edge's timestamp (it is
+# a flop output and changes on the edge), scan_in and scan_en after
+# them (the testbench drives them in the same step as the clock).
+
+import argparse
+import gzip
+import sys
+
+from ScanChain_starter import decode_registers, setup_chain
+
+
+SIGNALS = ("clk", "scan_en", "scan_in", "scan_out")
+
+_UNITS = {"s": 1e9, "ms": 1e6, "us": 1e3, "ns": 1.0, "ps": 1e-3, "fs": 1e-6}
+
+
+class VcdError(Exception):
+    pass
+
+
+def _open(filename):
+    if filename.endswith(".gz"):
+        return gzip.open(filename, "rt")
+    return open(filename, "r")
+
+
+# Streams a VCD file. Yields (time_ns, values) after every timestamp
+# in which one of `names` changed; values maps each name to its
+# binary string (MSB first, may contain x/z). The dict is reused
+# between yields. Signals are looked up in the shallowest scope that
+# declares them.
+
+def read_vcd(filename, names=SIGNALS):
+    ids = dict()            # identifier -> [names]
+    depth_of = dict()       # name -> scope depth it was found at
+    values = {name: "x" for name in names}
+    scale = 1.0
+    depth = 0
+    time = None
+    changed = False
+
+    with _open(filename) as f:
+        tokens = (token for line in f for token in line.split())
+        for token in tokens:
+            if token == "$enddefinitions":
+                next(tokens)
+                break
+            if token == "$timescale":
+                spec = ""
+                for part in tokens:
+                    if part == "$end":
+                        break
+                    spec += part
+                number = spec.rstrip("munpfs")
+                scale = float(number or 1) * _UNITS.get(spec[len(number):], 1.0)
+            elif token == "$scope":
+                depth += 1
+            elif token == "$upscope":
+                depth -= 1
+            elif token == "$var":
+                fields = list()
+                for part in tokens:
+                    if part == "$end":
+                        break
+                    fields.append(part)
+                ident, name = fields[2], fields[3]
+                if name in values and depth < depth_of.get(name, depth + 1):
+                    for others in ids.values():
+                        if name in others:
+                            others.remove(name)
+                    ids.setdefault(ident, list()).append(name)
+                    depth_of[name] = depth
+        else:
+            raise VcdError(f"{filename}: no $enddefinitions")
+
+        missing = [name for name in names if name not in depth_of]
+        if missing:
+            raise VcdError(f"{filename}: signals not found: {', '.join(missing)}")
+
+        for token in tokens:
+            head = token[0]
+            if head == "#":
+                if changed:
+                    yield time, values
+                    changed = False
+                time = int(token[1:]) * scale
+            elif head in "bBrR":
+                ident = next(tokens)
+                if ident in ids and head in "bB":
+                    for name in ids[ident]:
+                        values[name] = token[1:].lower()
+                    changed = True
+            elif head in "01xXzZ":
+                ident = token[1:]
+                if ident in ids:
+                    for name in ids[ident]:
+                        values[name] = head.lower()
+                    changed = True
+            # $dumpvars/$end/$comment... markers carry no values
+        if changed:
+            yield time, values
+
+
+def _bit(value, k):
+    if k >= len(value):
+        return 0 if value[0] in "01" else None   # zero-extended
+    char = value[len(value) - 1 - k]
+    return int(char) if char in "01" else None
+
+
+# Turns value changes into rising clock edges: yields
+# (time_ns, scan_en, scan_in, scan_out_before_edge).
+
+def clock_edges(blocks):
+    clk = "x"
+    scan_out = "x"
+    for time, values in blocks:
+        if clk == "0" and values["clk"] == "1":
+            yield time, values["scan_en"], values["scan_in"], scan_out
+        clk = values["clk"]
+        scan_out = values["scan_out"]
+
+
+# Groups edges into scan operations and rebuilds the chain image of
+# each. Yields (time_ns, "unload" | "load", image, known), where
+# `known` has a 1 for every image bit that was observed.
+
+def replay(chain, edges):
+    lengths = chain.chain_lengths
+    offsets = chain.chain_offsets
+    run = list()            # (time, scan_in, scan_out) of the current run
+
+    def finish():
+        start_time = run[0][0]
+        unload, unload_known = 0, 0
+        load, load_known = 0, 0
+        for k, length in enumerate(lengths):
+            for cycle, (_, _, out_value) in enumerate(run[:length]):
+                bit = _bit(out_value, k)
+                if bit is not None:
+                    position = offsets[k] + length - 1 - cycle
+                    unload |= bit << position
+                    unload_known |= 1 << position
+            # chain k takes its bits in the last `length` cycles
+            # of a lockstep shift of max(lengths) cycles
+            for age, (_, in_value, _) in enumerate(reversed(run[-length:])):
+                bit = _bit(in_value, k)
+                if bit is not None:
+                    load |= bit << (offsets[k] + age)
+                    load_known |= 1 << (offsets[k] + age)
+        return (start_time, "unload", unload, unload_known), (run[-1][0], "load", load, load_known)
+
+    for time, scan_en, scan_in, scan_out in edges:
+        if scan_en == "1":
+            run.append((time, scan_in, scan_out))
+        elif run:
+            yield from finish()
+            run = list()
+    if run:
+        yield from finish()
+
+
+def _format(value, known, size):
+    if known == (1 << size) - 1:
+        return str(value)
+    return "".join(str((value >> i) & 1) if (known >> i) & 1 else "x"
+                   for i in reversed(range(size)))
+
+
+# Prints the time-indexed register table for a dump.
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild scan-chain register values from a VCD dump.")
+    parser.add_argument("vcd", help="VCD file, optionally gzip-compressed (.gz)")
+    parser.add_argument("log", help="scan-chain .log file of the design")
+    parser.add_argument("-r", "--registers", help="comma-separated registers to show (default: all)")
+    parser.add_argument("--loads", action="store_true", help="also show the loaded patterns")
+    args = parser.parse_args(argv)
+
+    chain = setup_chain(args.log)
+    names = args.registers.split(",") if args.registers else list(chain.registers)
+    sizes = [chain.registers[name].size for name in names]
+
+    widths = [max(len(name), size) for name, size in zip(names, sizes)]
+    print(f"{'time (ns)':>12} {'op':6} " + " ".join(f"{n:>{w}}" for n, w in zip(names, widths)))
+    for time, op, image, known in replay(chain, clock_edges(read_vcd(args.vcd))):
+        if op == "load" and not args.loads:
+            continue
+        values = decode_registers(chain, image, names)
+        masks = decode_registers(chain, known, names)
+        cells = [_format(values[n], masks[n], s) for n, s in zip(names, sizes)]
+        print(f"{time:12.0f} {op:6} " + " ".join(f"{c:>{w}}" for c, w in zip(cells, widths)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
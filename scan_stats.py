@@ -0,0 +1,243 @@
+# Cycle and time accounting for scan operations.
+#
+# Functions in ScanChain_starter wrapped with @timed("name") record,
+# per operation:
+#   calls, shift_cycles (clocks with scan_en high), capture_cycles
+#   (clocks with scan_en low), sim_ns (simulated time), settle_ns
+#   (simulated time not spent in clock cycles, i.e. Timer waits) and
+#   wall_s (host time).
+# Times are exclusive: a nested operation's share is booked to it, not
+# to its caller, so the columns add up to the whole run. Registers get
+# a count of how often they were encoded into a pattern and decoded
+# from an unload, plus the shift/capture cycles and simulated time of
+# the passes that read or wrote them (STATS.attribute()). A pass is
+# booked in full to every register it moves, so register rows do not
+# add up to the totals.
+#
+# Simulated time comes from cocotb unless another backend installs its
+# own clock with set_time_source(), as netlist_sim does.
+#
+# Accounting is off unless SCAN_STATS names a JSON output file (or
+# STATS.enable() is called), so normal runs pay one flag check per
+# clock. The JSON can be folded into a cocotb results.xml as
+# <property> entries:
+#
+#   SCAN_STATS=scan_stats.json make -f testbench.mk
+#   python scan_stats.py scan_stats.json results.xml
+
+import argparse
+import contextlib
+import functools
+import json
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+
+_time_source = None
+
+
+# Replaces cocotb's clock with `func`, which returns the simulated
+# time in ns (None restores cocotb's).
+
+def set_time_source(func):
+    global _time_source
+    _time_source = func
+
+
+# Current simulated time in ns, from whichever clock is installed.
+
+def sim_ns():
+    if _time_source is not None:
+        return _time_source()
+    from cocotb.utils import get_sim_time
+    return get_sim_time("ns")
+
+
+class OpStats:
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.shift_cycles = 0
+        self.capture_cycles = 0
+        self.sim_ns = 0.0
+        self.wall_s = 0.0
+
+    def to_dict(self, clock_period_ns):
+        cycles = self.shift_cycles + self.capture_cycles
+        return {
+            "calls": self.calls,
+            "shift_cycles": self.shift_cycles,
+            "capture_cycles": self.capture_cycles,
+            "sim_ns": self.sim_ns,
+            "settle_ns": max(0.0, self.sim_ns - cycles * clock_period_ns),
+            "wall_s": round(self.wall_s, 6),
+        }
+
+
+class ScanStats:
+
+    def __init__(self, filename=None) -> None:
+        self.filename = filename        # JSON written by save()
+        self.enabled = filename is not None
+        self.clock_period_ns = 0        # Set by the testbench
+        self.ops = dict()               # Operation name -> OpStats
+        self.registers = dict()         # Register name -> counts, see _register()
+        self._stack = list()            # [name, sim start, wall start, child sim, child wall]
+        self._active = set()            # Registers the running passes are booked to
+
+    def enable(self, filename=None):
+        self.enabled = True
+        if filename is not None:
+            self.filename = filename
+
+    def reset(self):
+        self.ops.clear()
+        self.registers.clear()
+        self._stack.clear()
+        self._active.clear()
+
+    def _op(self, name):
+        op = self.ops.get(name)
+        if op is None:
+            op = self.ops[name] = OpStats()
+        return op
+
+    def enter(self, name):
+        self._op(name).calls += 1
+        self._stack.append([name, sim_ns(), time.perf_counter(), 0.0, 0.0])
+
+    def exit(self):
+        name, sim_start, wall_start, child_sim, child_wall = self._stack.pop()
+        sim = sim_ns() - sim_start
+        wall = time.perf_counter() - wall_start
+        op = self._op(name)
+        op.sim_ns += sim - child_sim
+        op.wall_s += wall - child_wall
+        if self._stack:
+            self._stack[-1][3] += sim
+            self._stack[-1][4] += wall
+
+    # Books n clock cycles to the innermost running operation, and to
+    # every register being attributed.
+    def clocks(self, n, shifting):
+        op = self._op(self._stack[-1][0] if self._stack else "other")
+        kind = "shift_cycles" if shifting else "capture_cycles"
+        setattr(op, kind, getattr(op, kind) + n)
+        for name in self._active:
+            self._register(name)[kind] += n
+
+    def _register(self, name):
+        counts = self.registers.get(name)
+        if counts is None:
+            counts = self.registers[name] = {"writes": 0, "reads": 0, "shift_cycles": 0,
+                                             "capture_cycles": 0, "sim_ns": 0.0}
+        return counts
+
+    def register(self, name, kind):
+        self._register(name)[kind] += 1
+
+    # Books the clocks and simulated time of the enclosed block to the
+    # named registers, e.g. around the chain passes that read or write
+    # them. Nested blocks naming the same register count once.
+    @contextlib.contextmanager
+    def attribute(self, names):
+        if not self.enabled:
+            yield
+            return
+        fresh = [name for name in names if name not in self._active]
+        self._active.update(fresh)
+        start = sim_ns()
+        try:
+            yield
+        finally:
+            elapsed = sim_ns() - start
+            for name in fresh:
+                self._active.discard(name)
+                self._register(name)["sim_ns"] += elapsed
+
+    def to_dict(self):
+        ops = {name: op.to_dict(self.clock_period_ns) for name, op in self.ops.items()}
+        totals = dict()
+        for entry in ops.values():
+            for key, value in entry.items():
+                totals[key] = totals.get(key, 0) + value
+        totals["wall_s"] = round(totals.get("wall_s", 0.0), 6)
+        return {
+            "clock_period_ns": self.clock_period_ns,
+            "totals": totals,
+            "ops": ops,
+            "registers": self.registers,
+        }
+
+    def save(self, filename=None):
+        filename = filename or self.filename
+        if filename is None:
+            return
+        with open(filename, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+
+STATS = ScanStats(os.environ.get("SCAN_STATS"))
+
+
+# Decorator for async scan operations.
+
+def timed(name):
+    def wrap(func):
+        @functools.wraps(func)
+        async def run(*args, **kwargs):
+            if not STATS.enabled:
+                return await func(*args, **kwargs)
+            STATS.enter(name)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                STATS.exit()
+        return run
+    return wrap
+
+
+# Flattens a stats dict into (name, value) properties,
+# e.g. ("scan.shift_image.shift_cycles", 128).
+
+def properties(stats):
+    props = [("scan.clock_period_ns", stats["clock_period_ns"])]
+    props += [(f"scan.total.{key}", value) for key, value in stats["totals"].items()]
+    for name, entry in stats["ops"].items():
+        props += [(f"scan.{name}.{key}", value) for key, value in entry.items()]
+    for name, entry in stats["registers"].items():
+        props += [(f"scan.register.{name}.{key}", value) for key, value in entry.items()]
+    return props
+
+
+# Adds the properties of a stats dict to every <testsuite> of a JUnit
+# element tree.
+
+def add_properties(tree, stats):
+    for suite in tree.getroot().iter("testsuite"):
+        container = suite.find("properties")
+        if container is None:
+            container = ET.Element("properties")
+            suite.insert(0, container)
+        for name, value in properties(stats):
+            ET.SubElement(container, "property", name=name, value=str(value))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fold scan statistics into a JUnit results file.")
+    parser.add_argument("stats", help="JSON written with SCAN_STATS")
+    parser.add_argument("results", help="results.xml to update in place")
+    args = parser.parse_args(argv)
+
+    with open(args.stats) as f:
+        stats = json.load(f)
+    tree = ET.parse(args.results)
+    add_properties(tree, stats)
+    tree.write(args.results, encoding="unicode")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
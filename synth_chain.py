@@ -0,0 +1,91 @@
+# Synthetic scan-wrapped designs for benchmarking.
+#
+# generate() writes a gate-level-style module plus its .log with any
+# number of FFs, registers and scan chains. Register r goes on chain
+# r % chains; within a chain the registers follow each other in order,
+# bit 0 nearest scan_in, like adder.log. In functional mode every
+# register inverts itself, so a capture changes every FF and the
+# expected unload is simply the complement of the load.
+#
+#   python synth_chain.py 100000 --registers 1000 --chains 4 -o synth/
+#   make -f testbench.mk MODULE=bench_shift TOPLEVEL=synth \
+#       VERILOG_SOURCES=$PWD/synth/synth.sv SCAN_LOG=synth/synth.log
+
+import argparse
+import os
+import sys
+
+
+# Splits `ffs` FFs into `registers` registers (sizes differ by at most
+# one) and places them on the chains. Returns [(name, size, chain)].
+
+def layout(ffs, registers, chains):
+    if not 1 <= chains <= registers <= ffs:
+        raise ValueError("need 1 <= chains <= registers <= ffs")
+    base, extra = divmod(ffs, registers)
+    return [(f"r{r}", base + (r < extra), r % chains) for r in range(registers)]
+
+
+def _bit(name, size, bit):
+    return name if size == 1 else f"{name}[{bit}]"
+
+
+# Writes <out_dir>/<name>.sv and <out_dir>/<name>.log and returns their
+# paths. The .log has a chain column only when chains > 1.
+
+def generate(out_dir, ffs, registers=None, chains=1, name="synth"):
+    if registers is None:
+        registers = max(chains, ffs // 32)
+    regs = layout(ffs, registers, chains)
+    os.makedirs(out_dir, exist_ok=True)
+    sv_path = os.path.join(out_dir, f"{name}.sv")
+    log_path = os.path.join(out_dir, f"{name}.log")
+
+    port = "" if chains == 1 else f" [{chains - 1}:0]"
+    tail = [None] * chains          # MSB of the last register on each chain
+    index = [0] * chains            # next free chain index
+
+    with open(sv_path, "w") as sv, open(log_path, "w") as log:
+        sv.write(f"/* Synthetic scan design: {ffs} FFs, {registers} registers, "
+                 f"{chains} chain(s) */\n\n")
+        sv.write(f"module {name}(clk, scan_in, scan_en, scan_out);\n")
+        sv.write(f"  input clk;\n  input scan_en;\n  input{port} scan_in;\n  output{port} scan_out;\n")
+        sv.write(f"  wire{port} scan_in;\n  wire{port} scan_out;\n")
+
+        for reg, size, k in regs:
+            prev = tail[k]
+            if prev is None:
+                prev = "scan_in" if chains == 1 else f"scan_in[{k}]"
+            shifted = prev if size == 1 else f"{{ {reg}[{size - 2}:0], {prev} }}"
+            decl = "" if size == 1 else f"[{size - 1}:0] "
+            sv.write(f"  reg {decl}{reg};\n")
+            sv.write(f"  always @(posedge clk)\n    {reg} <= scan_en ? {shifted} : ~{reg};\n")
+            tail[k] = _bit(reg, size, size - 1)
+
+            suffix = "" if chains == 1 else f" {k}"
+            log.write("".join(f"{index[k] + bit} {reg} {bit}{suffix}\n" for bit in range(size)))
+            index[k] += size
+
+        outs = [tail[k] for k in reversed(range(chains))]
+        sv.write(f"  assign scan_out = {outs[0] if chains == 1 else '{ ' + ', '.join(outs) + ' }'};\n")
+        sv.write("endmodule\n")
+
+    return sv_path, log_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic scan design and its .log.")
+    parser.add_argument("ffs", type=int, help="number of flip-flops")
+    parser.add_argument("--registers", type=int, help="number of registers (default ffs/32)")
+    parser.add_argument("--chains", type=int, default=1, help="number of scan chains")
+    parser.add_argument("--name", default="synth", help="module and file name")
+    parser.add_argument("-o", "--out", default="synth", help="output directory")
+    args = parser.parse_args(argv)
+
+    sv_path, log_path = generate(args.out, args.ffs, args.registers, args.chains, args.name)
+    print(f"wrote {sv_path} and {log_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
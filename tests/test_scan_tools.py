@@ -0,0 +1,218 @@
+# Checks of the netlist backend and the tools built on it: FSM
+# extraction, chain checks, chain maps, multi-chain shifting, the fault
+# truth tables, .log validation and the compression encoder.
+#
+#   python -m pytest -q tests
+#
+# Tests that drive ScanChain_starter need cocotb importable (it is not
+# used to simulate anything) and are skipped otherwise.
+
+import os
+import random
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "fault"))
+
+import chain_log
+import chain_map
+import netlist_sim
+import synth_chain
+from scan_compress import Decompressor, encode
+from truth_table import classify
+
+
+def _path(*parts):
+    return os.path.join(ROOT, *parts)
+
+
+# ScanChain_starter on the netlist_sim backend, with the .log cache
+# kept out of the tree.
+@pytest.fixture
+def sc(tmp_path, monkeypatch):
+    pytest.importorskip("cocotb")
+    import ScanChain_starter
+
+    load_log = chain_log.load_log
+    monkeypatch.setattr(chain_log, "load_log", lambda f: load_log(f, cache_dir=str(tmp_path / "cache")))
+    monkeypatch.setattr(ScanChain_starter, "Timer", netlist_sim.Timer)
+    return ScanChain_starter
+
+
+def _simulator(sv_path):
+    sim = netlist_sim.Simulator(netlist_sim.parse_netlist(sv_path))
+    for name in ("clk", "scan_en", "scan_in"):
+        sim.write(name, 0)
+    return sim
+
+
+#-------------------------------------------------------------------
+
+# (state, data_avail) -> (next state, (buf_en, out_sel, out_writing)),
+# read off the hidden_fsm netlist: 0 waits for data, then
+# 4 -> 1 -> 2 -> 3 and back, where 3 behaves like 0
+HIDDEN_FSM = {
+    (0, 0): (0, (1, 0, 0)), (0, 1): (4, (1, 0, 0)),
+    (1, 0): (2, (0, 2, 1)), (1, 1): (2, (0, 2, 1)),
+    (2, 0): (3, (0, 3, 1)), (2, 1): (3, (0, 3, 1)),
+    (3, 0): (0, (1, 0, 0)), (3, 1): (4, (1, 0, 0)),
+    (4, 0): (1, (0, 1, 1)), (4, 1): (1, (0, 1, 1)),
+}
+
+
+def test_hidden_fsm_transitions(sc):
+    sim = _simulator(_path("hidden_fsm", "hidden_fsm_out.sv"))
+    sim.write("data_avail", 0)
+    chain = sc.setup_chain(_path("hidden_fsm", "hidden_fsm.log"))
+    sc.CHAIN_LENGTH = chain.chain_length
+
+    table = netlist_sim.run_coroutine(
+        sc.extract_fsm(sim.dut, chain, "cur_state", {"data_avail": 1},
+                       ["buf_en", "out_sel", "out_writing"]), sim)
+    assert table == HIDDEN_FSM
+
+
+# The adder with the scan path into a_reg[3] (FF 8) tied to 0.
+def test_check_chain_locates_break(sc, tmp_path):
+    source = open(_path("adder", "adder_out.sv")).read()
+    broken = source.replace("_13_ = scan_en ? \\a_reg[2]  :", "_13_ = scan_en ? 1'b0 :")
+    assert broken != source
+    sv_path = tmp_path / "adder_out.sv"
+    sv_path.write_text(broken)
+
+    chain = sc.setup_chain(_path("adder", "adder.log"))
+    for path, expected in ((_path("adder", "adder_out.sv"), []),
+                           (str(sv_path), ["chain 0: stuck-at-0, broken at or before the scan input "
+                                           "of FF 8 (a_reg[3]); FF 8 onward shift out"])):
+        sim = _simulator(path)
+        for name in ("a_in", "b_in"):
+            sim.write(name, 0)
+        problems = netlist_sim.run_coroutine(sc.check_chain(sim.dut, chain, {"a_in": 4, "b_in": 4}), sim)
+        assert problems == expected
+
+
+@pytest.mark.parametrize("design", ["hidden_fsm", "adder"])
+def test_chain_map_matches_log(design):
+    chains = chain_map.map_netlist(_path(design, f"{design}_out.sv"))
+    assert chain_map.compare_log(chains, _path(design, f"{design}.log")) == []
+
+
+#-------------------------------------------------------------------
+
+@pytest.fixture
+def synth(tmp_path):
+    # 5 registers of 8 bits on 3 chains; each register inverts itself
+    # on a capture cycle
+    return synth_chain.generate(str(tmp_path / "synth"), 40, 5, 3)
+
+
+def test_apply_patterns_multi_chain(sc, synth):
+    sv_path, log_path = synth
+    chain = sc.setup_chain(log_path)
+    assert len(chain.chain_lengths) == 3
+    sim = _simulator(sv_path)
+
+    rng = random.Random(1)
+    patterns = [rng.getrandbits(chain.chain_length) for _ in range(6)]
+    results = netlist_sim.run_coroutine(
+        sc.apply_patterns(sim.dut, patterns, length=chain.chain_lengths), sim)
+
+    mask = (1 << chain.chain_length) - 1
+    assert [unload for unload, _ in results] == [~p & mask for p in patterns]
+
+
+def test_read_write_registers_round_trip(sc, synth):
+    sv_path, log_path = synth
+    chain = sc.setup_chain(log_path)
+    sim = _simulator(sv_path)
+    run = lambda coro: netlist_sim.run_coroutine(coro, sim)
+
+    values = {name: 0x11 * (i + 1) for i, name in enumerate(chain.registers)}
+    for name, value in values.items():
+        assert run(sc.write_registers(sim.dut, chain, {name: value})) == {name: 0}
+
+    assert run(sc.read_registers(sim.dut, chain)) == values
+    assert run(sc.write_registers(sim.dut, chain, {"r1": 0xa5, "r3": 0x0f})) == {"r1": 0x22, "r3": 0x44}
+    values.update(r1=0xa5, r3=0x0f)
+    assert run(sc.read_registers(sim.dut, chain)) == values
+    assert run(sc.read_register(sim.dut, chain, "r4")) == 0x55
+
+
+def test_output_chain_recirculate_multi_chain(sc, synth):
+    sv_path, log_path = synth
+    chain = sc.setup_chain(log_path)
+    sim = _simulator(sv_path)
+    run = lambda coro: netlist_sim.run_coroutine(coro, sim)
+
+    image = random.Random(2).getrandbits(chain.chain_length)
+    run(sc.shift_image(sim.dut, image, chain.chain_lengths))
+    for ff_index in (0, 13, 27):
+        bits = run(sc.output_chain(sim.dut, ff_index, 8, recirculate=True, length=chain.chain_lengths))
+        assert bits == sc.image_to_bits(image >> ff_index, 8)
+    assert run(sc.shift_image(sim.dut, 0, chain.chain_lengths)) == image
+
+
+#-------------------------------------------------------------------
+
+def test_fault_failing_minterms():
+    results = classify([_path("fault", f"fault{k}.sv") for k in range(1, 6)])
+    failing = {os.path.basename(f): minterms for f, (minterms, _, _) in results.items()}
+    # minterm m has a, b, c, d as the bits of m, a the most significant
+    assert failing == {
+        "fault1.sv": [0b0000, 0b0001, 0b0011, 0b0100, 0b0101, 0b0111],
+        "fault2.sv": [0b0100, 0b0101, 0b0111, 0b1000, 0b1001, 0b1011],
+        "fault3.sv": [0b0000, 0b0001, 0b0011, 0b1100, 0b1101, 0b1111],
+        "fault4.sv": [0b0010, 0b0100, 0b0101, 0b0110, 0b0111,
+                      0b1000, 0b1001, 0b1010, 0b1011, 0b1110],
+        "fault5.sv": [],
+    }
+    assert results[_path("fault", "fault2.sv")][1:] == (0, ["xor_out stuck-at-1"])
+
+
+#-------------------------------------------------------------------
+
+def _write_log(tmp_path, lines):
+    path = tmp_path / "chain.log"
+    path.write_text("".join(line + "\n" for line in lines))
+    return str(path)
+
+
+def test_chain_log_validation(tmp_path):
+    log = chain_log.read_log(_write_log(tmp_path, ["0 a 0", "1 a 1", "0 b 0 1"]))
+    assert log.names == ["a", "b"] and log.chain_lengths == [2, 1]
+
+    for lines in (["0 a 0", "0 b 0"],           # index used twice
+                  ["0 a 0", "2 b 0"],           # index 1 missing
+                  ["0 a 0", "1 a 0"],           # register bit used twice
+                  ["0 a 1"],                    # register bit 0 missing
+                  ["0 a 0 0", "0 b 0 2"],       # chain 1 empty
+                  ["0 a"]):                     # short line
+        with pytest.raises(chain_log.ChainLogError):
+            chain_log.read_log(_write_log(tmp_path, lines))
+
+
+#-------------------------------------------------------------------
+
+def test_encode_reproduces_care_bits():
+    chains, length = 8, 32
+    decomp = Decompressor(channels=2, chains=chains)
+    lengths = [length] * chains
+    cycles = decomp.cycles(lengths)
+    rng = random.Random(3)
+
+    for _ in range(10):
+        image = rng.getrandbits(chains * length)
+        care = sum(1 << i for i in range(chains * length) if rng.random() < 0.05)
+        stimulus = encode(decomp, lengths, image, care)
+
+        # bit k of the word of cycle c ends up in FF cycles-1-c of chain k
+        loaded = 0
+        for cycle, word in enumerate(decomp.expand(stimulus, cycles)):
+            index = cycles - 1 - cycle
+            if index < length:
+                for k in range(chains):
+                    loaded |= ((word >> k) & 1) << (k * length + index)
+        assert (loaded ^ image) & care == 0
@@ -0,0 +1,133 @@
+# Windowed waveform dumps from the testbench.
+#
+# A full --trace run dumps every shift cycle of every pattern. A
+# WaveTracer instead records only while a window is open, e.g. around
+# one capture cycle or a failing pattern, and writes a VCD that is
+# gzip-compressed when the file name ends in .gz (GTKWave reads it
+# directly). Recording stops for good once `max_bytes` of VCD text have
+# been written. For a compressed full-run trace use TRACE=fst in
+# testbench.mk instead.
+#
+#   tracer = WaveTracer(dut, ["clk", "scan_en", "scan_in", "scan_out"],
+#                       "capture.vcd.gz")
+#   async with tracer.window("pattern 3"):
+#       await capture_cycle(dut, 3)
+#   tracer.close()
+
+import contextlib
+import gzip
+
+import cocotb
+from cocotb.triggers import Edge, First
+from cocotb.utils import get_sim_time
+
+
+def _identifiers():
+    n = 0
+    while True:
+        ident, k = "", n
+        while True:
+            ident += chr(33 + k % 94)
+            k //= 94
+            if not k:
+                break
+        yield ident
+        n += 1
+
+
+class WaveTracer:
+
+    def __init__(self, dut, signals, filename, max_bytes=64 << 20) -> None:
+        self.dut = dut
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.handles = list()           # (name, handle, width, identifier)
+        self.written = 0                # VCD characters written so far
+        self.full = False               # size cap reached
+        self.windows = 0                # windows recorded
+
+        self._file = None
+        self._task = None
+        self._last = dict()             # identifier -> last value written
+        self._time = None               # last timestamp written (ps)
+
+        ids = _identifiers()
+        for name in signals:
+            try:
+                handle = getattr(dut, name)
+            except AttributeError:
+                dut._log.warning(f"wave_trace: no signal {name}, skipped")
+                continue
+            self.handles.append((name, handle, len(handle), next(ids)))
+
+    def _write(self, text):
+        self._file.write(text)
+        self.written += len(text)
+        if self.written >= self.max_bytes and not self.full:
+            self.full = True
+            self._file.write("$comment trace size limit reached $end\n")
+
+    def _open(self):
+        opener = gzip.open if self.filename.endswith(".gz") else open
+        self._file = opener(self.filename, "wt")
+        header = ["$timescale 1ps $end", f"$scope module {self.dut._name} $end"]
+        for name, _, width, ident in self.handles:
+            header.append(f"$var wire {width} {ident} {name} $end")
+        header += ["$upscope $end", "$enddefinitions $end", ""]
+        self._write("\n".join(header))
+
+    # Writes every signal whose value differs from the last one written
+    # (all of them when `force`), under the current timestamp.
+    def _sample(self, force=False):
+        now = int(get_sim_time("ps"))    # a float in cocotb 1.x; VCD times are integers
+        lines = list()
+        for _, handle, width, ident in self.handles:
+            try:
+                value = handle.value.binstr.lower()
+            except AttributeError:
+                value = format(int(handle.value), f"0{width}b")
+            if force or self._last.get(ident) != value:
+                self._last[ident] = value
+                lines.append(f"{value}{ident}" if width == 1 else f"b{value} {ident}")
+        if lines:
+            if now != self._time:
+                self._time = now
+                lines.insert(0, f"#{now}")
+            self._write("\n".join(lines) + "\n")
+
+    async def _watch(self):
+        edges = [Edge(handle) for _, handle, _, _ in self.handles]
+        while not self.full:
+            await First(*edges)
+            self._sample()
+
+    # Starts recording; the current value of every signal is dumped
+    # first. Does nothing once the size cap has been reached.
+    def start(self, label=None):
+        if self.full or self._task is not None or not self.handles:
+            return
+        if self._file is None:
+            self._open()
+        self.windows += 1
+        self._write(f"$comment window {label if label is not None else self.windows} $end\n")
+        self._sample(force=True)
+        self._task = cocotb.start_soon(self._watch())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.kill()
+            self._task = None
+
+    @contextlib.asynccontextmanager
+    async def window(self, label=None):
+        self.start(label)
+        try:
+            yield self
+        finally:
+            self.stop()
+
+    def close(self):
+        self.stop()
+        if self._file is not None:
+            self._file.close()
+            self._file = None